@@ -0,0 +1,204 @@
+"""Counts of live, public blog posts per tag, per category and per pair.
+
+The counts live in the cache, one key per facet, so the listing can show
+"N posts" next to every tag and category (and the cursor paginator can
+take its total from them) without a GROUP BY per request. The tags in use
+are kept with them, so listing them needs no join either:
+
+    "all"                   every post
+    "tag:<id>"              posts with a tag
+    "category:<id>"         posts in a category
+    "pair:<tag>:<category>" posts with a tag and in a category
+
+Publishing and unpublishing a post adjust the counts it contributes to
+with ``incr``/``decr`` (see blog/signals.py); the tags and categories each
+post was counted under are kept alongside, so a publish that changes them
+moves the post between facets. All keys hold a version, and if anything
+goes missing (eviction, a new deploy) the whole set is rebuilt from the
+database under a new version. A rebuild stores every facet of the tags and
+categories in use, zeros included, so a count missing on read was evicted
+rather than zero.
+"""
+import time
+from collections import Counter
+
+from django.core.cache import cache
+
+VERSION_KEY = "blog:facets:version"
+
+
+def facet_key(version, facet):
+    return "blog:facets:{}:{}".format(version, facet)
+
+
+def post_key(version, pk):
+    return "blog:facets:{}:post:{}".format(version, pk)
+
+
+def tags_key(version):
+    return "blog:facets:{}:tags".format(version)
+
+
+def get_facets(tag_ids, category_ids):
+    """The facets a post with these tags and categories is counted under."""
+    facets = {"all"}
+    facets.update("tag:{}".format(tag_id) for tag_id in tag_ids)
+    facets.update("category:{}".format(category_id) for category_id in category_ids)
+    facets.update(
+        "pair:{}:{}".format(tag_id, category_id)
+        for tag_id in tag_ids
+        for category_id in category_ids
+    )
+    return facets
+
+
+def rebuild():
+    """Count every live, public post from scratch; returns the new version."""
+    # blog.models uses this module
+    from taggit.models import Tag
+
+    from .models import BlogCategory, BlogDetailPage, BlogPageTag
+
+    # A subquery rather than the ids, which can outnumber the SQL variables allowed
+    posts = BlogDetailPage.objects.live().public()
+    pks = set(posts.values_list("pk", flat=True))
+    tags = {pk: set() for pk in pks}
+    categories = {pk: set() for pk in pks}
+    for pk, tag_id in BlogPageTag.objects.filter(
+        content_object__in=posts.values("pk")
+    ).values_list("content_object_id", "tag_id"):
+        tags[pk].add(tag_id)
+    Categories = BlogDetailPage.categories.through
+    for pk, category_id in Categories.objects.filter(
+        blogdetailpage__in=posts.values("pk")
+    ).values_list("blogdetailpage_id", "blogcategory_id"):
+        categories[pk].add(category_id)
+
+    tags_in_use = list(
+        Tag.objects.filter(blog_blogpagetag_items__isnull=False).distinct().order_by(
+            "name"
+        ).values_list("pk", "name", "slug")
+    )
+    counts = Counter(dict.fromkeys(get_facets(
+        {tag_id for tag_id, name, slug in tags_in_use},
+        set(BlogCategory.objects.values_list("pk", flat=True)),
+    ), 0))
+    for pk in pks:
+        counts.update(get_facets(tags[pk], categories[pk]))
+
+    version = int(time.time() * 1000)
+    values = {facet_key(version, facet): count for facet, count in counts.items()}
+    values.update(
+        (post_key(version, pk), (sorted(tags[pk]), sorted(categories[pk])))
+        for pk in pks
+    )
+    values[tags_key(version)] = tags_in_use
+    cache.set_many(values, None)
+    cache.set(VERSION_KEY, version, None)
+    return version
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = rebuild()
+    return version
+
+
+def invalidate():
+    """Rebuild on the next lookup, e.g. after a tag or category was deleted."""
+    cache.delete(VERSION_KEY)
+
+
+def update_post(pk, tag_ids=None, category_ids=None):
+    """Count post ``pk`` under these tags and categories, or uncount it (None)."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Built from the database, which already has the change, on next use
+        return
+
+    if tag_ids and not set(tag_ids) <= {tag_id for tag_id, name, slug in get_tags()}:
+        # A tag used for the first time; listed (with its zero counts) by a rebuild
+        invalidate()
+        return
+
+    counted = cache.get(post_key(version, pk))
+    old = get_facets(*counted) if counted is not None else set()
+    listed = tag_ids is not None and category_ids is not None
+    new = get_facets(tag_ids, category_ids) if listed else set()
+    try:
+        for facet in old - new:
+            cache.decr(facet_key(version, facet))
+        for facet in new - old:
+            cache.add(facet_key(version, facet), 0, None)
+            cache.incr(facet_key(version, facet))
+    except ValueError:
+        # A count was evicted; the others can't be trusted either
+        invalidate()
+        return
+
+    if listed:
+        cache.set(post_key(version, pk), (sorted(tag_ids), sorted(category_ids)), None)
+    else:
+        cache.delete(post_key(version, pk))
+
+
+def get_tags():
+    """``[(id, name, slug), ...]`` of the tags used on blog posts, by name."""
+    tags = cache.get(tags_key(get_version()))
+    if tags is None:
+        tags = cache.get(tags_key(rebuild()), [])
+    return tags
+
+
+def get_count(tag_id=None, category_id=None):
+    """Number of posts with the tag and/or in the category (all posts if neither)."""
+    if tag_id is not None and category_id is not None:
+        facet = "pair:{}:{}".format(tag_id, category_id)
+    elif tag_id is not None:
+        facet = "tag:{}".format(tag_id)
+    elif category_id is not None:
+        facet = "category:{}".format(category_id)
+    else:
+        facet = "all"
+    return _get_many([facet])[facet]
+
+
+def get_tag_counts(tag_ids, category_id=None):
+    """``{tag_id: count}``, within one category if given."""
+    return _get_counts(
+        tag_ids,
+        lambda tag_id: (
+            "tag:{}".format(tag_id) if category_id is None
+            else "pair:{}:{}".format(tag_id, category_id)
+        ),
+    )
+
+
+def get_category_counts(category_ids, tag_id=None):
+    """``{category_id: count}``, of posts with one tag if given."""
+    return _get_counts(
+        category_ids,
+        lambda category_id: (
+            "category:{}".format(category_id) if tag_id is None
+            else "pair:{}:{}".format(tag_id, category_id)
+        ),
+    )
+
+
+def _get_counts(ids, get_facet):
+    facets = {pk: get_facet(pk) for pk in ids}
+    counts = _get_many(facets.values())
+    return {pk: counts[facet] for pk, facet in facets.items()}
+
+
+def _get_many(facets):
+    """``{facet: count}``, rebuilt from the database if any count was evicted."""
+    facets = set(facets)
+    version = get_version()
+    found = cache.get_many([facet_key(version, facet) for facet in facets])
+    if len(found) < len(facets):
+        version = rebuild()
+        found = cache.get_many([facet_key(version, facet) for facet in facets])
+    # Still missing: a tag or category created since, with no posts yet
+    return {facet: found.get(facet_key(version, facet), 0) for facet in facets}
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from mysite import page_cache
+
+
+class Command(BaseCommand):
+    help = "Show the page cache hit/miss counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Reset the counters after printing them."
+        )
+
+    def handle(self, *args, **options):
+        stats = page_cache.get_stats()
+        self.stdout.write(
+            "hits: {hits}\nmisses: {misses}\nhit ratio: {hit_ratio:.1%}".format(**stats)
+        )
+        if options["reset"]:
+            page_cache.reset_stats()
+            self.stdout.write("Counters reset.")
@@ -0,0 +1,38 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from blog.models import BlogDetailPage
+from blog.renditions import create_executor, generate_renditions, get_required_renditions
+
+
+class Command(BaseCommand):
+    help = "Generate every image rendition used by live blog posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=None,
+            help="Number of worker processes (defaults to the number of CPUs).",
+        )
+
+    def handle(self, *args, **options):
+        # Merge the specs of all posts so an image shared between posts is
+        # opened once.
+        required = defaultdict(set)
+        for page in BlogDetailPage.objects.live().specific():
+            for image_id, specs in get_required_renditions(page).items():
+                required[image_id].update(specs)
+
+        self.stdout.write(
+            "Generating renditions for {} images...".format(len(required))
+        )
+        with create_executor(options["workers"]) as executor:
+            futures = [
+                executor.submit(generate_renditions, image_id, sorted(specs))
+                for image_id, specs in required.items()
+            ]
+            total = sum(future.result() for future in futures)
+
+        self.stdout.write(self.style.SUCCESS(
+            "Done: {} renditions checked or created.".format(total)
+        ))
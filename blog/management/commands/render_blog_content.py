@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import BlogDetailPage, BlogRenderedContent
+
+
+class Command(BaseCommand):
+    help = "Render and store the content of every live blog post."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--missing", action="store_true",
+            help="Only render posts that have no stored content yet.",
+        )
+
+    def handle(self, *args, **options):
+        pages = BlogDetailPage.objects.live().specific()
+        if options["missing"]:
+            pages = pages.filter(rendered_content__isnull=True)
+
+        count = 0
+        for page in pages.iterator():
+            BlogRenderedContent.store(page)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            "Done: stored the content of {} posts.".format(count)
+        ))
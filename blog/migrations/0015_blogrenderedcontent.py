@@ -0,0 +1,29 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtailcore', '0059_apply_collection_ordering'),
+        ('blog', '0014_articleblogpage_date_published'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlogRenderedContent',
+            fields=[
+                ('page', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rendered_content', serialize=False, to='blog.blogdetailpage')),
+                ('html', models.TextField(blank=True)),
+                ('text', models.TextField(blank=True)),
+                ('references', models.JSONField(default=dict)),
+                ('dependencies_key', models.CharField(max_length=32)),
+                ('rendered_at', models.DateTimeField(auto_now=True)),
+                ('revision', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='wagtailcore.pagerevision')),
+            ],
+            options={
+                'verbose_name': 'Rendered blog content',
+                'verbose_name_plural': 'Rendered blog content',
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations, models
+
+
+def deduplicate_category_slugs(apps, schema_editor):
+    """Give every category but the first with a given slug a numbered one."""
+    BlogCategory = apps.get_model('blog', 'BlogCategory')
+    seen = set(BlogCategory.objects.values_list('slug', flat=True).distinct())
+    used = set()
+    for category in BlogCategory.objects.order_by('pk'):
+        if category.slug not in used:
+            used.add(category.slug)
+            continue
+        n = 2
+        while '{}-{}'.format(category.slug, n) in seen:
+            n += 1
+        category.slug = '{}-{}'.format(category.slug, n)
+        seen.add(category.slug)
+        used.add(category.slug)
+        category.save(update_fields=['slug'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0015_blogrenderedcontent'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_category_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='blogcategory',
+            name='slug',
+            field=models.SlugField(allow_unicode=True, help_text='A slug to identify posts by this category', max_length=255, unique=True, verbose_name='slug'),
+        ),
+        # The join table's own indexes lead with the post; category pages
+        # look posts up by category, so index (category, post) as well.
+        migrations.RunSQL(
+            'CREATE INDEX blog_blogdetailpage_categories_category_post '
+            'ON blog_blogdetailpage_categories (blogcategory_id, blogdetailpage_id);',
+            'DROP INDEX blog_blogdetailpage_categories_category_post;',
+        ),
+    ]
@@ -0,0 +1,47 @@
+from collections import Counter
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def count_archive_months(apps, schema_editor):
+    # View restrictions are not applied here; the next publish or unpublish
+    # in a month recounts it with them.
+    BlogDetailPage = apps.get_model('blog', 'BlogDetailPage')
+    BlogArchiveMonth = apps.get_model('blog', 'BlogArchiveMonth')
+    counts = Counter()
+    for published_at in BlogDetailPage.objects.filter(
+        live=True, first_published_at__isnull=False
+    ).values_list('first_published_at', flat=True):
+        published_at = timezone.localtime(published_at)
+        counts[published_at.year, published_at.month] += 1
+    BlogArchiveMonth.objects.bulk_create([
+        BlogArchiveMonth(year=year, month=month, count=count)
+        for (year, month), count in counts.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0016_blogcategory_unique_slug'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlogArchiveMonth',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Blog archive month',
+                'verbose_name_plural': 'Blog archive months',
+                'ordering': ['-year', '-month'],
+                'unique_together': {('year', 'month')},
+            },
+        ),
+        migrations.RunPython(count_archive_months, migrations.RunPython.noop),
+    ]
@@ -1,15 +1,30 @@
 """Blog listing and blog detail pages."""
+import hashlib
+import html
+import json
+from datetime import MAXYEAR, MINYEAR, datetime
+from urllib.parse import urlencode
+
 from django import forms
+from django.conf import settings
 from django.core.cache import cache
-from django.core.cache.utils import make_template_fragment_key
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
-from django.shortcuts import render
+from django.db.models import prefetch_related_objects
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render
+from django.utils import feedgenerator, timezone
+from django.utils.cache import get_conditional_response
+from django.utils.html import strip_tags
+from django.utils.http import http_date
+from django.utils.safestring import mark_safe
+from django.utils.text import Truncator
 
 from modelcluster.fields import ParentalKey, ParentalManyToManyField
 from modelcluster.contrib.taggit import ClusterTaggableManager
 from rest_framework.fields import Field
-from taggit.models import TaggedItemBase
+from taggit.models import Tag, TaggedItemBase
 from wagtail.api import APIField
 from wagtail.admin.edit_handlers import (
     FieldPanel,
@@ -22,10 +37,27 @@ from wagtail.core.fields import StreamField
 from wagtail.core.models import Page, Orderable
 from wagtail.images.edit_handlers import ImageChooserPanel
 from wagtail.images.api.fields import ImageRenditionField
+from wagtail.search import index
 from wagtail.contrib.routable_page.models import RoutablePageMixin, route
 from wagtail.snippets.models import register_snippet
 
+from mysite.generations import dependencies_hash, get_generation
+from mysite.page_cache import CachedPageMixin
+from mysite.page_urls import page_url_cache
 from streams import blocks
+from streams.render_cache import collect_references, prime_render_cache
+from streams.richtext import prime_richtext
+
+from . import facets
+from .pagination import (
+    CursorPaginator,
+    annotate_sort_date,
+    decode_cursor,
+    filter_after,
+    make_cursor,
+)
+from .querysets import BlogPageManager
+from .renditions import card_images, prefetch_renditions
 
 
 class ImageSerializedField(Field):
@@ -132,6 +164,7 @@ class BlogCategory(models.Model):
         verbose_name="slug",
         allow_unicode=True,
         max_length=255,
+        unique=True,
         help_text='A slug to identify posts by this category',
     )
 
@@ -152,37 +185,79 @@ class BlogCategory(models.Model):
 register_snippet(BlogCategory)
 
 
+def serialize_child_page(row, site_roots):
+    """Turn a values() row of a child page into its API representation."""
+    return {
+        'id': row['id'],
+        'title': row['title'],
+        'slug': row['slug'],
+        'url': site_roots.get_url(row['url_path']),
+        'first_published_at': row['first_published_at'],
+    }
+
+
+def iter_child_pages_json(child_pages, chunk_size=2000):
+    """Yield a JSON array of child pages piece by piece, for StreamingHttpResponse."""
+    site_roots = page_url_cache.site_roots
+    # The same order as the paged "posts" API field
+    rows = annotate_sort_date(child_pages).order_by('-sort_date', '-pk').values(
+        *BlogChildPagesSerializer.projection
+    ).iterator(chunk_size=chunk_size)
+    yield '['
+    for i, row in enumerate(rows):
+        yield (',' if i else '') + json.dumps(
+            serialize_child_page(row, site_roots), cls=DjangoJSONEncoder
+        )
+    yield ']'
+
+
 class BlogChildPagesSerializer(Field):
+    """Child pages of a listing, newest first, read from a values() projection.
+
+    Takes ?posts_limit= (default 20, at most 100) and ?posts_after=<cursor>
+    from the API request; the cursor for the next batch is returned as
+    next_cursor. For the full list use the listing's posts.json route,
+    which streams it.
+    """
+
+    projection = ('id', 'title', 'slug', 'url_path', 'first_published_at')
+    default_limit = 20
+    max_limit = 100
+
     def to_representation(self, child_pages):
-        # logic in here
-        return_posts = []
-        for child in child_pages:
-            post_dict = {
-                'id': child.id,
-                'title': child.title,
-                'slug': child.slug,
-                'url': child.url,
-            }
-            return_posts.append(post_dict)
-        return return_posts
-        # Pythonic comprehensions
-        # return [
-        #     {
-        #         'id': child.id,
-        #         'title': child.title,
-        #         'slug': child.slug,
-        #         'url': child.url,
-        #     } for child in child_pages
-        # ]
-
-
-class BlogListingPage(RoutablePageMixin, Page):
+        request = self.context.get('request')
+        params = request.GET if request is not None else {}
+        try:
+            limit = min(int(params.get('posts_limit', self.default_limit)), self.max_limit)
+        except ValueError:
+            limit = self.default_limit
+
+        child_pages = annotate_sort_date(child_pages).order_by('-sort_date', '-pk')
+        position = decode_cursor(params['posts_after']) if params.get('posts_after') else None
+        if position is not None:
+            child_pages = filter_after(child_pages, position)
+
+        # One extra row tells us whether there is a next batch
+        rows = list(child_pages.values(*self.projection, 'sort_date')[:limit + 1])
+        site_roots = page_url_cache.site_roots
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = make_cursor(rows[-1]['sort_date'], rows[-1]['id'])
+        return {
+            'items': [serialize_child_page(row, site_roots) for row in rows],
+            'next_cursor': next_cursor,
+        }
+
+
+class BlogListingPage(CachedPageMixin, RoutablePageMixin, Page):
     """Listing page lists all the Blog Detail Pages."""
 
     template = "blog/blog_listing_page.html"
     ajax_template = "blog/blog_listing_page_ajax.html"
     max_count = 1
     subpage_types = ['blog.VideoBlogPage', 'blog.ArticleBlogPage']
+    posts_per_page = 2
 
     custom_title = models.CharField(
         max_length=100,
@@ -195,88 +270,288 @@ class BlogListingPage(RoutablePageMixin, Page):
         FieldPanel("custom_title"),
     ]
 
-    # api_fields = [
-    #     APIField("posts", serializer=BlogChildPagesSerializer(
-    #         source='get_child_pages')),
-    # ]
+    # Routes listed in the sitemap along with the page (see get_sitemap_urls)
+    sitemap_routes = [("latest_posts", 0.9)]
+
+    # Cached by the API with this page's generation, which publishing,
+    # moving or deleting a child bumps (see mysite/api.py, blog/signals.py)
+    api_fields = [
+        APIField("posts", serializer=BlogChildPagesSerializer(
+            source='get_child_pages')),
+    ]
 
     @property
     def get_child_pages(self):
         return self.get_children().public().live()
-        # return self.get_children().public().live().values("id", "title", "slug")
 
     def get_context(self, request, *args, **kwargs):
-        """Adding custom stuff to our context."""
-        context = super().get_context(request, *args, **kwargs)
+        """The main listing: every post, or those with ?tag=."""
         # Get all posts
-        all_posts = BlogDetailPage.objects.live().public().order_by('-first_published_at')
+        all_posts = BlogDetailPage.objects.live().public().order_by(
+            '-first_published_at').specific_prefetched()
 
+        tag = self.get_tag_filter(request)
         if request.GET.get('tag', None):
             tags = request.GET.get('tag')
             all_posts = all_posts.filter(tags__slug__in=[tags])
 
-        # Paginate all posts by 2 per page
-        paginator = Paginator(all_posts, 2)
+        if getattr(settings, "BLOG_CURSOR_PAGINATION", False):
+            posts = self.paginate_by_cursor(request, all_posts, self.get_post_count(request, tag))
+        else:
+            posts = self.paginate_by_page_number(request, all_posts)
+
+        return self.get_listing_context(request, posts, tag=tag)
+
+    def get_listing_context(self, request, posts, **filters):
+        """The listing template's context for a page of ``posts``.
+
+        ``posts`` are already the specific pages (ArticleBlogPage,
+        VideoBlogPage) with banner images, categories, tags and authors
+        loaded in bulk. ``filters`` (``tag``, ``category``) are added to the
+        context and narrow the facet counts. Only Page.get_context runs
+        besides, none of the main listing's queries.
+        """
+        context = super().get_context(request)
+        context.update(filters)
+        context["posts"] = posts
+        context["categories"] = BlogCategory.objects.all()
+        context.update(self.get_facets(context["categories"], **filters))
+        context["archive_months"] = self.get_archive_months()
+        prefetch_renditions((post.banner_image, "fill-250x250") for post in posts)
+        return context
+
+    def paginate_by_page_number(self, request, all_posts):
+        """Classic ?page=x pagination. Runs a COUNT(*) and an OFFSET query."""
+        paginator = Paginator(all_posts, self.posts_per_page)
         # Try to get the ?page=x value
         page = request.GET.get("page")
         try:
             # If the page exists and the ?page=x is an int
-            posts = paginator.page(page)
+            return paginator.page(page)
         except PageNotAnInteger:
             # If the ?page=x is not an int; show the first page
-            posts = paginator.page(1)
+            return paginator.page(1)
         except EmptyPage:
             # If the ?page=x is out of range (too high most likely)
             # Then return the last page
-            posts = paginator.page(paginator.num_pages)
+            return paginator.page(paginator.num_pages)
+
+    def get_tag_filter(self, request):
+        """The Tag of ?tag=<slug>, or None."""
+        slug = request.GET.get("tag")
+        if not slug:
+            return None
+        return Tag.objects.filter(slug=slug).first()
+
+    def get_post_count(self, request, tag=None, category=None):
+        """The number of posts matching the filters, from the facet counts."""
+        if request.GET.get("tag") and tag is None:
+            # Unknown tag
+            return 0
+        return facets.get_count(
+            tag_id=tag.pk if tag else None,
+            category_id=category.pk if category else None,
+        )
 
-        # "posts" will have child pages; you'll need to use .specific in the template
-        # in order to access child properties, such as youtube_video_id and subtitle
-        context["posts"] = posts
-        context["categories"] = BlogCategory.objects.all()
-        return context
+    def get_facets(self, categories, tag=None, category=None):
+        """Tags and categories in use, with post counts within the current filter.
+
+        Counts come from blog/facets.py, so no GROUP BY runs per request.
+        """
+        tags = facets.get_tags()
+        tag_counts = facets.get_tag_counts(
+            [tag_id for tag_id, name, slug in tags],
+            category_id=category.pk if category else None,
+        )
+        category_counts = facets.get_category_counts(
+            [c.pk for c in categories], tag_id=tag.pk if tag else None
+        )
+        listing_url = page_url_cache.get_url(self)
+        query = "?" + urlencode({"tag": tag.slug}) if tag else ""
+        return {
+            "tag_facets": [
+                {"name": name, "slug": slug, "count": tag_counts[tag_id]}
+                for tag_id, name, slug in tags if tag_counts[tag_id]
+            ],
+            "category_facets": [
+                {
+                    "name": c.name,
+                    "slug": c.slug,
+                    "url": listing_url + self.reverse_subpage(
+                        "category_view", args=(c.slug,)
+                    ) + query,
+                    "count": category_counts[c.pk],
+                }
+                for c in categories if category_counts[c.pk]
+            ],
+        }
+
+    def paginate_by_cursor(self, request, all_posts, count=None):
+        """?after=<token> / ?before=<token> pagination on (published date, id).
+
+        Enabled with the BLOG_CURSOR_PAGINATION setting."""
+        paginator = CursorPaginator(all_posts, self.posts_per_page, count)
+        return paginator.page(
+            after=request.GET.get("after"),
+            before=request.GET.get("before"),
+        )
+
+    def get_archive_months(self):
+        """Months with posts, newest first, with their counts and archive URLs."""
+        listing_url = page_url_cache.get_url(self)
+        return [
+            {
+                "date": datetime(archive_month.year, archive_month.month, 1),
+                "count": archive_month.count,
+                "url": listing_url + self.reverse_subpage(
+                    "blogs_by_year", args=(archive_month.year, archive_month.month)
+                ),
+            }
+            for archive_month in BlogArchiveMonth.objects.filter(count__gt=0)
+        ]
 
     @route(r"^july-2019/$", name="july_2019")
+    @route(r"^year/(\d+)/$", name="blogs_by_year_only")
     @route(r"^year/(\d+)/(\d+)/$", name="blogs_by_year")
     def blogs_by_year(self, request, year=None, month=None):
-        context = self.get_context(request)
-        # Implement your BlogDetailPage filter. Maybe something like this:
-        # if year is not None and month is not None:
-        #     posts = BlogDetailPage.objects.live().public().filter(year=year, month=month)
-        # else:
-        #     # No year and no month were set, assume this is july-2019 only posts
-        #     posts = BlogDetailPage.objects.live().public().filter(year=2019, month=07)
-        # print(year)
-        # print(month)
-        # context["posts"] = posts
-
-        # Note: The below template (latest_posts.html) will need to be adjusted
-        return render(request, "blog/latest_posts.html", context)
+        """Posts first published in a month (or a whole year), newest first.
+
+        A range on the indexed first_published_at column, paged with cursors;
+        the total comes from BlogArchiveMonth instead of a COUNT(*).
+        """
+        if year is None:
+            # /july-2019/
+            year, month = 2019, 7
+        year = int(year)
+        month = int(month) if month is not None else None
+        # The month after December 9999 (or a time zone shift at either end)
+        # is outside what datetime can represent
+        if not MINYEAR < year < MAXYEAR or (month is not None and not 1 <= month <= 12):
+            raise Http404
+
+        if month is None:
+            start, end = month_bounds(year, 1)[0], month_bounds(year, 12)[1]
+            archive_months = BlogArchiveMonth.objects.filter(year=year)
+        else:
+            start, end = month_bounds(year, month)
+            archive_months = BlogArchiveMonth.objects.filter(year=year, month=month)
+        all_posts = BlogDetailPage.objects.live().public().filter(
+            first_published_at__gte=start, first_published_at__lt=end
+        ).specific_prefetched()
+        count = sum(archive_month.count for archive_month in archive_months)
+        posts = self.paginate_by_cursor(request, all_posts, count)
+
+        context = self.get_listing_context(request, posts)
+        context["archive_date"] = datetime(year, month or 1, 1)
+        context["archive_is_month"] = month is not None
+        return render(request, "blog/blog_listing_page.html", context)
 
     @route(r"^category/(?P<cat_slug>[-\w]*)/$", name="category_view")
     def category_view(self, request, cat_slug):
-        """Find blog posts based on a category."""
-        context = self.get_context(request)
+        """Posts in one category, newest first, with cursor pagination.
+
+        The posts are found through the category/post index on the
+        categories table and paged like the main listing, so a page of a
+        category costs the same however many posts it has. Unknown slugs
+        are a 404.
+        """
+        category = get_object_or_404(BlogCategory, slug=cat_slug)
+        all_posts = BlogDetailPage.objects.live().public().filter(
+            categories=category
+        ).specific_prefetched()
+        tag = self.get_tag_filter(request)
+        if request.GET.get("tag"):
+            all_posts = all_posts.filter(tags__slug=request.GET["tag"])
+
+        posts = self.paginate_by_cursor(
+            request, all_posts, self.get_post_count(request, tag, category)
+        )
 
-        try:
-            # Look for the blog category by its slug.
-            category = BlogCategory.objects.get(slug=cat_slug)
-        except Exception:
-            # Blog category doesnt exist (ie /blog/category/missing-category/)
-            # Redirect to self.url, return a 404.. that's up to you!
-            category = None
-
-        if category is None:
-            # This is an additional check.
-            # If the category is None, do something. Maybe default to a particular category.
-            # Or redirect the user to /blog/ ¯\_(ツ)_/¯
-            pass
-
-        context["posts"] = BlogDetailPage.objects.live(
-        ).public().filter(categories__in=[category])
-
-        # Note: The below template (latest_posts.html) will need to be adjusted
-        return render(request, "blog/latest_posts.html", context)
+        context = self.get_listing_context(request, posts, tag=tag, category=category)
+        return render(request, "blog/blog_listing_page.html", context)
+
+    @route(r'^feed/$', name="feed")
+    def rss_feed(self, request):
+        """RSS 2.0 feed of the newest posts."""
+        return self.serve_feed(request, feedgenerator.Rss201rev2Feed, "feed")
+
+    @route(r'^feed/atom/$', name="atom_feed")
+    def atom_feed(self, request):
+        """Atom 1.0 feed of the newest posts."""
+        return self.serve_feed(request, feedgenerator.Atom1Feed, "atom_feed")
+
+    def serve_feed(self, request, feed_class, route_name):
+        """The feed XML, cached until a post is published, unpublished or moved.
+
+        Its ETag and Last-Modified (the newest publication time in it) let
+        polling feed readers get a 304 until then.
+        """
+        key = "blog:feed:{}:{}:{}.{}".format(
+            self.pk, route_name, get_generation("feed"), get_generation("page_cache")
+        )
+        feed = cache.get(key)
+        if feed is None:
+            feed = self.build_feed(feed_class, route_name)
+            cache.set(key, feed, getattr(settings, "BLOG_FEED_CACHE_TIMEOUT", 60 * 60 * 24))
+        content, last_modified = feed
+
+        etag = '"{}"'.format(hashlib.md5(key.encode("utf-8")).hexdigest())
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if not_modified is not None:
+            return not_modified
+
+        response = HttpResponse(content, content_type=feed_class.content_type)
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    def build_feed(self, feed_class, route_name):
+        """Return the feed XML and its last modification timestamp.
+
+        Read from a values() projection; item descriptions are taken from the
+        plain text stored at publish time (BlogRenderedContent), so no
+        StreamField is rendered.
+        """
+        listing_url = page_url_cache.get_full_url(self)
+        feed = feed_class(
+            title=self.custom_title or self.title,
+            link=listing_url,
+            description=self.search_description or self.title,
+            feed_url=listing_url + self.reverse_subpage(route_name),
+            language=settings.LANGUAGE_CODE,
+        )
+        rows = BlogDetailPage.objects.live().public().order_by(
+            "-first_published_at", "-pk"
+        ).values(
+            "title",
+            "custom_title",
+            "url_path",
+            "first_published_at",
+            "last_published_at",
+            "rendered_content__text",
+        )[:getattr(settings, "BLOG_FEED_ITEMS", 20)]
+
+        site_roots = page_url_cache.site_roots
+        last_modified = None
+        for row in rows:
+            url = site_roots.get_full_url(row["url_path"])
+            updated = row["last_published_at"] or row["first_published_at"]
+            feed.add_item(
+                title=row["custom_title"] or row["title"],
+                link=url,
+                description=Truncator(row["rendered_content__text"] or "").words(60),
+                unique_id=url,
+                pubdate=row["first_published_at"],
+                updateddate=updated,
+            )
+            if updated and (last_modified is None or updated > last_modified):
+                last_modified = updated
+
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        return feed.writeString("utf-8"), timestamp
 
     @route(r'^latest/$', name="latest_posts")
     def latest_blog_posts_only_shows_last_5(self, request, *args, **kwargs):
@@ -284,17 +559,28 @@ class BlogListingPage(RoutablePageMixin, Page):
         context["posts"] = context["posts"][:1]
         return render(request, "blog/latest_posts.html", context)
 
+    @route(r'^posts\.json/$', name="posts_json")
+    def posts_json(self, request):
+        """Every live child post as a JSON array, streamed as it is read."""
+        return StreamingHttpResponse(
+            iter_child_pages_json(self.get_child_pages),
+            content_type="application/json",
+        )
+
     def get_sitemap_urls(self, request):
         # Uncomment to have no sitemap for this page
         # return []
-        sitemap = super().get_sitemap_urls(request)
-        sitemap.append(
-            {
-                "location": self.full_url + self.reverse_subpage("latest_posts"),
-                "lastmod": (self.last_published_at or self.latest_revision_created_at),
-                "priority": 0.9,
-            }
-        )
+        location = page_url_cache.get_full_url(self)
+        lastmod = self.last_published_at or self.latest_revision_created_at
+        sitemap = [{"location": location, "lastmod": lastmod}]
+        for route_name, priority in self.sitemap_routes:
+            sitemap.append(
+                {
+                    "location": location + self.reverse_subpage(route_name),
+                    "lastmod": lastmod,
+                    "priority": priority,
+                }
+            )
         return sitemap
 
 
@@ -306,8 +592,10 @@ class BlogPageTag(TaggedItemBase):
     )
 
 
-class BlogDetailPage(Page):
+class BlogDetailPage(CachedPageMixin, Page):
     """Parental blog detail page."""
+    objects = BlogPageManager()
+
     subpage_types = []
     parent_page_types = ['blog.BlogListingPage']
     tags = ClusterTaggableManager(through=BlogPageTag, blank=True)
@@ -364,16 +652,80 @@ class BlogDetailPage(Page):
         APIField("content"),
     ]
 
-    def save(self, *args, **kwargs):
-        """Create a template fragment key.
+    search_fields = Page.search_fields + [
+        index.SearchField("custom_title", partial_match=True, boost=3),
+        index.SearchField("content"),
+        index.RelatedFields("tags", [
+            index.SearchField("name", partial_match=True, boost=2),
+        ]),
+        index.RelatedFields("categories", [
+            index.SearchField("name", boost=2),
+        ]),
+        index.RelatedFields("blog_authors", [
+            index.RelatedFields("author", [
+                index.SearchField("name"),
+            ]),
+        ]),
+    ]
+
+    # Loaded in bulk for every page of v2 API results (see mysite/api.py)
+    api_prefetch_related = ["blog_authors__author__image"]
 
-        Then delete the key."""
-        key = make_template_fragment_key(
-            "blog_post_preview",
-            [self.id]
+    # Loaded in bulk by BlogPageQuerySet.specific_prefetched() for listings
+    listing_select_related = ["banner_image"]
+    listing_prefetch_related = ["categories", "tags", "blog_authors__author__image"]
+
+    def get_context(self, request, *args, **kwargs):
+        """Load authors, categories, renditions and rich text the template shows up front."""
+        context = super().get_context(request, *args, **kwargs)
+        prefetch_related_objects([self], "categories", "blog_authors__author__image")
+        renditions = [(self.banner_image, "fill-1200x300")] + [
+            (orderable.author.image, "fill-50x50") for orderable in self.blog_authors.all()
+        ]
+        context["rendered_content"] = self.get_rendered_content(request)
+        if context["rendered_content"] is None:
+            renditions += [(image, "fill-300x200") for image in card_images(self)]
+            # Expand every rich text block of the post with one lookup per type,
+            # and read the cached card blocks with one get_many
+            prime_richtext(self.content)
+            prime_render_cache(self.content)
+        prefetch_renditions(renditions)
+        return context
+
+    def get_rendered_content(self, request=None):
+        """The content HTML stored at publish time, or None to render it live.
+
+        Previews always render the draft live. Stored HTML that links to a
+        page or shows an image that has changed since is rendered again.
+        """
+        if getattr(request, "is_preview", False):
+            return None
+        try:
+            rendered = self.rendered_content
+        except BlogRenderedContent.DoesNotExist:
+            return None
+        if not rendered.is_current():
+            rendered = BlogRenderedContent.store(self, rendered.revision)
+        return mark_safe(rendered.html)
+
+    def get_api_renditions(self):
+        """The (image, filter spec) pairs BlogAuthorsOrderable.api_fields render."""
+        return [
+            (orderable.author.image, "fill-200x250")
+            for orderable in self.blog_authors.all()
+        ]
+
+    @property
+    def cache_generation(self):
+        """Changes whenever this post or its banner image changes.
+
+        Part of the blog_post_preview fragment cache key, so publishing,
+        unpublishing, moving or deleting the post, or editing its banner
+        image, all invalidate the cached preview."""
+        return "{}.{}".format(
+            get_generation("page", self.pk),
+            get_generation("image", self.banner_image_id) if self.banner_image_id else 0,
         )
-        cache.delete(key)
-        return super().save(*args, **kwargs)
 
 
 # First subclassed blog post page
@@ -402,6 +754,11 @@ class ArticleBlogPage(BlogDetailPage):
         "Date article published", blank=True, null=True
     )
 
+    search_fields = BlogDetailPage.search_fields + [
+        index.SearchField("subtitle", boost=2),
+        index.SearchField("introduction"),
+    ]
+
     content_panels = Page.content_panels + [
         FieldPanel("date_published"),
         FieldPanel("custom_title"),
@@ -455,3 +812,121 @@ class VideoBlogPage(BlogDetailPage):
         FieldPanel("youtube_video_id"),
         StreamFieldPanel("content"),
     ]
+
+
+class BlogRenderedContent(models.Model):
+    """The content StreamField of a published post, rendered at publish time.
+
+    Detail pages serve ``html`` instead of converting and rendering every
+    block on each request; ``text`` is the same content as plain text. The
+    ids of the pages and images the content refers to are kept so the HTML
+    can be checked against their generations (see ``is_current``).
+    "manage.py render_blog_content" fills this in for existing posts.
+    """
+
+    page = models.OneToOneField(
+        "blog.BlogDetailPage",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="rendered_content",
+    )
+    revision = models.ForeignKey(
+        "wagtailcore.PageRevision",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    html = models.TextField(blank=True)
+    text = models.TextField(blank=True)
+    references = models.JSONField(default=dict)
+    dependencies_key = models.CharField(max_length=32)
+    rendered_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Rendered blog content"
+        verbose_name_plural = "Rendered blog content"
+
+    def __str__(self):
+        return str(self.page_id)
+
+    @staticmethod
+    def get_dependencies_key(references):
+        # Not the global page_cache generation: image, snippet and Site saves
+        # would make every stored post render and write again
+        return dependencies_hash(references.get("pages", []), references.get("images", []))
+
+    def is_current(self):
+        """False once a page or image the HTML was rendered from has changed."""
+        return self.dependencies_key == self.get_dependencies_key(self.references)
+
+    @classmethod
+    def store(cls, page, revision=None):
+        """Render ``page.content`` and save it as the page's stored content."""
+        stream_block = page.content.stream_block
+        page_ids, image_ids = set(), set()
+        collect_references(
+            stream_block, stream_block.get_prep_value(page.content), page_ids, image_ids
+        )
+        references = {"pages": sorted(page_ids), "images": sorted(image_ids)}
+
+        prime_richtext(page.content)
+        prime_render_cache(page.content)
+        context = {"page": page, "self": page}
+        content_html = "".join(str(block.render(context=context)) for block in page.content)
+        content_text = " ".join(html.unescape(strip_tags(content_html)).split())
+
+        rendered, created = cls.objects.update_or_create(
+            page_id=page.pk,
+            defaults={
+                "revision": revision,
+                "html": content_html,
+                "text": content_text,
+                "references": references,
+                "dependencies_key": cls.get_dependencies_key(references),
+            },
+        )
+        return rendered
+
+
+def month_bounds(year, month):
+    """The first instant of a month and of the month after, in the current time zone."""
+    start = timezone.make_aware(datetime(year, month, 1))
+    if month == 12:
+        end = timezone.make_aware(datetime(year + 1, 1, 1))
+    else:
+        end = timezone.make_aware(datetime(year, month + 1, 1))
+    return start, end
+
+
+class BlogArchiveMonth(models.Model):
+    """How many live, public posts were first published in a month.
+
+    Recounted for the post's month whenever a post is published,
+    unpublished or deleted (see blog/signals.py), so the archive sidebar and
+    month pages never count posts themselves.
+    """
+
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Blog archive month"
+        verbose_name_plural = "Blog archive months"
+        unique_together = [("year", "month")]
+        ordering = ["-year", "-month"]
+
+    def __str__(self):
+        return "{}-{:02d}".format(self.year, self.month)
+
+    @classmethod
+    def recount(cls, published_at):
+        """Recount the month ``published_at`` falls in."""
+        published_at = timezone.localtime(published_at)
+        year, month = published_at.year, published_at.month
+        start, end = month_bounds(year, month)
+        count = BlogDetailPage.objects.live().public().filter(
+            first_published_at__gte=start, first_published_at__lt=end
+        ).count()
+        cls.objects.update_or_create(year=year, month=month, defaults={"count": count})
@@ -0,0 +1,165 @@
+"""Keyset (cursor) pagination for the blog listing.
+
+Posts are ordered by ``(published date, id)`` descending and each page is
+fetched with a ``WHERE`` on the last row of the previous page instead of an
+``OFFSET``, so page 200 costs the same as page 1. The total is passed in by
+the caller (the listing takes it from blog/facets.py) rather than a
+``COUNT(*)`` per request.
+
+The published date is ``first_published_at``. Pages that are live without
+ever having been published (created by ``add_child`` in a migration or an
+import) have none; they fall back to ``go_live_at``, then to
+``latest_revision_created_at``, then to the epoch, so they still get a
+position of their own.
+"""
+import math
+from datetime import datetime
+
+from django.core import signing
+from django.db.models import DateTimeField, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import utc
+
+CURSOR_SALT = "blog.pagination.cursor"
+
+EPOCH = datetime(1970, 1, 1, tzinfo=utc)
+
+
+def annotate_sort_date(queryset):
+    """Add ``sort_date``, the never-NULL published date that cursors page on."""
+    return queryset.annotate(sort_date=Coalesce(
+        "first_published_at",
+        "go_live_at",
+        "latest_revision_created_at",
+        Value(EPOCH, output_field=DateTimeField()),
+    ))
+
+
+def get_sort_date(page):
+    """The ``sort_date`` of a page that wasn't loaded with the annotation."""
+    return (
+        page.first_published_at or page.go_live_at
+        or page.latest_revision_created_at or EPOCH
+    )
+
+
+def filter_after(queryset, position):
+    """Rows of an annotated queryset that come after ``position``, newest first."""
+    sort_date, pk = position
+    return queryset.filter(
+        Q(sort_date__lt=sort_date) | Q(sort_date=sort_date, pk__lt=pk)
+    ).order_by("-sort_date", "-pk")
+
+
+def filter_before(queryset, position):
+    """Rows of an annotated queryset that come before ``position``, oldest first."""
+    sort_date, pk = position
+    return queryset.filter(
+        Q(sort_date__gt=sort_date) | Q(sort_date=sort_date, pk__gt=pk)
+    ).order_by("sort_date", "pk")
+
+
+def make_cursor(sort_date, pk):
+    """Return an opaque token for the position ``(sort_date, pk)``."""
+    return signing.dumps([(sort_date or EPOCH).isoformat(), pk], salt=CURSOR_SALT)
+
+
+def encode_cursor(post):
+    """Return an opaque token pointing at ``post``."""
+    return make_cursor(get_sort_date(post), post.pk)
+
+
+def decode_cursor(token):
+    """Return ``(sort_date, pk)`` for a token, or None if it is invalid."""
+    try:
+        published, pk = signing.loads(token, salt=CURSOR_SALT)
+        published = parse_datetime(published)
+        pk = int(pk)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    if published is None:
+        return None
+    return published, pk
+
+
+class CursorPage:
+    """One page of posts plus the tokens needed to reach its neighbours."""
+
+    is_cursor_page = True
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Paginate a BlogDetailPage queryset on ``(sort_date, id)``."""
+
+    def __init__(self, queryset, per_page, count=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self._count = count
+
+    @property
+    def count(self):
+        """Number of posts; counted with a query only if none was passed in."""
+        if self._count is None:
+            self._count = self.queryset.count()
+        return self._count
+
+    @property
+    def num_pages(self):
+        return max(1, math.ceil(self.count / self.per_page))
+
+    def page(self, after=None, before=None):
+        """Return the page following ``after`` or preceding ``before``."""
+        queryset = annotate_sort_date(self.queryset).order_by("-sort_date", "-pk")
+        position = decode_cursor(before) if before else None
+        backwards = position is not None
+        if not backwards and after:
+            position = decode_cursor(after)
+
+        if backwards:
+            queryset = filter_before(queryset, position)
+        elif position is not None:
+            queryset = filter_after(queryset, position)
+
+        # Fetch one extra row to find out whether there is anything beyond this page
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+
+        if not rows:
+            return CursorPage(rows, self)
+        return CursorPage(
+            rows,
+            self,
+            next_cursor=encode_cursor(rows[-1]) if has_next else None,
+            previous_cursor=encode_cursor(rows[0]) if has_previous else None,
+        )
@@ -0,0 +1,61 @@
+"""Querysets for the blog page types."""
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.query import BaseIterable
+from wagtail.core.models import Page, PageManager
+from wagtail.core.query import PageQuerySet
+
+
+def specific_prefetched(queryset):
+    """Return ``queryset`` yielding specific pages with their relations preloaded.
+
+    Works like Wagtail's ``.specific()``, one query per content type, but also
+    applies the ``listing_select_related`` / ``listing_prefetch_related``
+    lookups declared on each page model. Templates can then read
+    ``post.specific.subtitle``, ``post.banner_image`` or ``post.categories.all``
+    for a whole page of results without extra queries.
+    """
+    clone = queryset._chain()
+    clone._iterable_class = PrefetchedSpecificIterable
+    return clone
+
+
+class PrefetchedSpecificIterable(BaseIterable):
+    def __iter__(self):
+        return prefetched_specific_iterator(self.queryset)
+
+
+def prefetched_specific_iterator(queryset):
+    # Preserve the ordering (and any slicing) of the original queryset
+    pks_and_types = list(queryset.values_list("pk", "content_type"))
+
+    pks_by_type = defaultdict(list)
+    for pk, content_type_id in pks_and_types:
+        pks_by_type[content_type_id].append(pk)
+
+    pages_by_type = {}
+    for content_type_id, pks in pks_by_type.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class() or Page
+        pages = model.objects.filter(pk__in=pks)
+        select_related = getattr(model, "listing_select_related", None)
+        if select_related:
+            pages = pages.select_related(*select_related)
+        prefetch_related = getattr(model, "listing_prefetch_related", None)
+        if prefetch_related:
+            pages = pages.prefetch_related(*prefetch_related)
+        pages_by_type[content_type_id] = {page.pk: page for page in pages}
+
+    for pk, content_type_id in pks_and_types:
+        page = pages_by_type[content_type_id].get(pk)
+        if page is not None:
+            yield page
+
+
+class BlogPageQuerySet(PageQuerySet):
+    def specific_prefetched(self):
+        """See :func:`specific_prefetched`."""
+        return specific_prefetched(self)
+
+
+BlogPageManager = PageManager.from_queryset(BlogPageQuerySet)
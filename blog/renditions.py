@@ -0,0 +1,198 @@
+"""Image renditions each page type needs, and their pregeneration.
+
+Templates ask for fixed rendition specs (``fill-250x250`` on the listing,
+``fill-1200x300`` banners, ``fill-50x50`` author avatars, ...). Every
+getter registered here returns the images a page shows with a given set of
+specs, so all renditions for a page can be generated when it is published,
+in a background thread, instead of by the first visitor. The
+pregenerate_renditions management command does the same for every live
+post in a process pool.
+
+``prefetch_renditions`` is the read side: it loads the renditions a page
+render is about to ask for with one query and puts them in the
+``renditions`` cache, where the ``{% image %}`` tag looks first.
+"""
+import logging
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, caches
+from django.db import connection
+
+from wagtail.images import get_image_model
+from wagtail.images.models import Filter
+
+logger = logging.getLogger(__name__)
+
+_registry = defaultdict(list)
+
+
+def register(model_label, specs):
+    """Register a function returning the images of a ``model_label`` page shown with ``specs``."""
+    def decorator(get_images):
+        _registry[model_label].append((get_images, tuple(specs)))
+        return get_images
+    return decorator
+
+
+def get_rendition_specs(model):
+    """Return every (image getter, specs) pair registered for ``model`` or its parents."""
+    return [
+        entry
+        for klass in model.__mro__
+        if hasattr(klass, "_meta")
+        for entry in _registry.get(klass._meta.label, [])
+    ]
+
+
+def get_required_renditions(page):
+    """Return ``{image_id: {spec, ...}}`` for all renditions ``page`` needs."""
+    page = page.specific
+    required = defaultdict(set)
+    for get_images, specs in get_rendition_specs(type(page)):
+        for image in get_images(page):
+            if image is not None:
+                required[image.pk].update(specs)
+    return required
+
+
+@register("blog.BlogDetailPage", ["fill-250x250", "fill-1200x300", "fill-850x450-c50"])
+def banner_image(page):
+    """Listing thumbnail, post banner and home page teaser."""
+    return [page.banner_image]
+
+
+@register("blog.BlogDetailPage", ["fill-50x50", "fill-200x250"])
+def author_images(page):
+    """Author avatars on the post and author images in the v2 API."""
+    return [
+        orderable.author.image
+        for orderable in page.blog_authors.select_related("author__image")
+    ]
+
+
+@register("blog.BlogDetailPage", ["fill-300x200"])
+def card_images(page):
+    """Card images in CardBlock."""
+    return [
+        card["image"]
+        for block in page.content or []
+        if block.block_type == "cards"
+        for card in block.value["cards"]
+    ]
+
+
+def get_rendition_cache():
+    """Return Wagtail's ``renditions`` cache, or None if it isn't configured."""
+    try:
+        return caches["renditions"]
+    except InvalidCacheBackendError:
+        return None
+
+
+def rendition_cache_key(rendition):
+    return rendition.construct_cache_key(
+        rendition.image_id, rendition.focal_point_key, rendition.filter_spec
+    )
+
+
+def prefetch_renditions(pairs):
+    """Warm the renditions cache for ``(image, filter spec)`` pairs.
+
+    Renditions already in the cache cost nothing; all the others are loaded
+    with a single query. The ``{% image %}`` tags that follow then read them
+    from the cache instead of doing one lookup each. Renditions that don't
+    exist yet are left for ``{% image %}`` to generate as usual.
+    """
+    cache = get_rendition_cache()
+    if cache is None:
+        return
+    pairs = [(image, spec) for image, spec in pairs if image is not None]
+    Rendition = get_image_model().get_rendition_model()
+
+    wanted = {}
+    for image, spec in pairs:
+        focal_point_key = Filter(spec=spec).get_cache_key(image)
+        key = Rendition.construct_cache_key(image.pk, focal_point_key, spec)
+        wanted[key] = image
+
+    missing = set(wanted) - set(cache.get_many(wanted.keys()))
+    if not missing:
+        return
+
+    renditions = Rendition.objects.filter(
+        image_id__in={wanted[key].pk for key in missing},
+        filter_spec__in={spec for image, spec in pairs},
+    )
+    found = {}
+    for rendition in renditions:
+        key = rendition_cache_key(rendition)
+        if key in missing:
+            # Reuse the image we already have, rendition.alt reads its title
+            rendition.image = wanted[key]
+            found[key] = rendition
+    cache.set_many(found)
+
+
+def generate_renditions(image_id, specs):
+    """Create any missing renditions of one image. Runs in a pool worker."""
+    Image = get_image_model()
+    try:
+        image = Image.objects.get(pk=image_id)
+    except Image.DoesNotExist:
+        return 0
+    for spec in specs:
+        image.get_rendition(spec)
+    return len(specs)
+
+
+def create_executor(max_workers=None):
+    """A process pool for generating renditions in bulk, outside web workers.
+
+    "spawn" so workers don't inherit the parent's database connections;
+    each worker sets Django up once and then handles many images.
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=django.setup,
+    )
+
+
+_executor = None
+
+
+def get_executor():
+    """The thread pool that generates renditions for published pages.
+
+    Threads rather than processes: forking or spawning from a web worker
+    duplicates it (and its connections) for work that mostly waits on
+    storage and Pillow, which releases the GIL.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "RENDITION_PREGENERATION_WORKERS", 2),
+            thread_name_prefix="renditions",
+        )
+    return _executor
+
+
+def _generate_in_thread(image_id, specs):
+    try:
+        return generate_renditions(image_id, specs)
+    except Exception:
+        logger.exception("Rendition pregeneration failed for image %s", image_id)
+    finally:
+        # Each pool thread opens its own connection; don't leave it idle
+        connection.close()
+
+
+def pregenerate_page_renditions(page):
+    """Queue every rendition ``page`` needs in the background thread pool."""
+    executor = get_executor()
+    for image_id, specs in get_required_renditions(page).items():
+        executor.submit(_generate_in_thread, image_id, sorted(specs))
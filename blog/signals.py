@@ -0,0 +1,244 @@
+"""Signal handlers that keep the blog's caches up to date."""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from wagtail.core.models import Page, PageViewRestriction, Site
+from wagtail.core.signals import page_published, page_unpublished, post_page_move
+from wagtail.documents import get_document_model
+from wagtail.images import get_image_model
+from taggit.models import Tag
+
+from mysite import sitemaps
+from mysite.generations import bump_generation
+from mysite.page_urls import page_url_cache
+from search.suggest import suggestion_index
+
+from . import facets
+from .models import (
+    BlogArchiveMonth,
+    BlogAuthor,
+    BlogCategory,
+    BlogDetailPage,
+    BlogRenderedContent,
+)
+from .renditions import pregenerate_page_renditions
+
+
+def page_changed(page, parent=None):
+    """Invalidate what is cached for a page, the page listing it and the home page."""
+    bump_generation("page", page.pk)
+
+    parent = parent or page.get_parent()
+    if parent is not None:
+        bump_generation("page", parent.pk)
+
+    site = page.get_site()
+    if site is not None:
+        bump_generation("page", site.root_page_id)
+
+
+@receiver(page_published)
+@receiver(page_unpublished)
+def page_publication_changed(sender, instance, **kwargs):
+    page_changed(instance)
+    # Cached search results, API listings and feeds may now include or miss this page
+    bump_generation("search")
+    bump_generation("api")
+    bump_generation("feed")
+
+
+@receiver(page_published)
+def update_suggestions(sender, instance, **kwargs):
+    if isinstance(instance, BlogDetailPage):
+        suggestion_index.update_source(
+            ("page", instance.pk), [instance.title, instance.custom_title]
+        )
+        for tag in instance.tags.all():
+            suggestion_index.update_source(("tag", tag.pk), [tag.name])
+
+
+@receiver(page_unpublished)
+@receiver(post_delete, sender=BlogDetailPage)
+def remove_suggestions(sender, instance, **kwargs):
+    suggestion_index.remove_source(("page", instance.pk))
+
+
+@receiver(post_save, sender=BlogCategory)
+def update_category_suggestions(sender, instance, **kwargs):
+    suggestion_index.update_source(("category", instance.pk), [instance.name])
+
+
+@receiver(post_delete, sender=BlogCategory)
+def remove_category_suggestions(sender, instance, **kwargs):
+    suggestion_index.remove_source(("category", instance.pk))
+
+
+@receiver(post_save, sender=Tag)
+def update_tag_suggestions(sender, instance, **kwargs):
+    suggestion_index.update_source(("tag", instance.pk), [instance.name])
+
+
+@receiver(page_published)
+def store_rendered_content(sender, instance, revision=None, **kwargs):
+    if isinstance(instance, BlogDetailPage):
+        BlogRenderedContent.store(instance, revision)
+
+
+@receiver(page_unpublished)
+def delete_rendered_content(sender, instance, **kwargs):
+    BlogRenderedContent.objects.filter(page_id=instance.pk).delete()
+
+
+@receiver(page_published)
+def count_facets(sender, instance, **kwargs):
+    if not isinstance(instance, BlogDetailPage):
+        return
+    if BlogDetailPage.objects.public().filter(pk=instance.pk).exists():
+        tag_ids = [tag.pk for tag in instance.tags.all()]
+        category_ids = [category.pk for category in instance.categories.all()]
+    else:
+        # Behind a view restriction: live, but not listed
+        tag_ids = category_ids = None
+    transaction.on_commit(lambda: facets.update_post(instance.pk, tag_ids, category_ids))
+
+
+@receiver(page_unpublished)
+@receiver(post_delete, sender=BlogDetailPage)
+def uncount_facets(sender, instance, **kwargs):
+    transaction.on_commit(lambda: facets.update_post(instance.pk))
+
+
+@receiver(post_delete, sender=BlogCategory)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=PageViewRestriction)
+@receiver(post_delete, sender=PageViewRestriction)
+@receiver(post_page_move)
+def recount_facets(sender, **kwargs):
+    # Changes the facets (or the visibility) of many posts at once, or the
+    # names of the tags listed with them
+    transaction.on_commit(facets.invalidate)
+
+
+@receiver(post_save, sender=BlogCategory)
+def add_category_facets(sender, instance, created, **kwargs):
+    if created:
+        # Its zero counts are stored by the next rebuild; until then every
+        # listing would find them missing and rebuild
+        transaction.on_commit(facets.invalidate)
+
+
+@receiver(page_published)
+@receiver(page_unpublished)
+@receiver(post_delete, sender=BlogDetailPage)
+def recount_archive_month(sender, instance, **kwargs):
+    if isinstance(instance, BlogDetailPage) and instance.first_published_at:
+        published_at = instance.first_published_at
+        transaction.on_commit(lambda: BlogArchiveMonth.recount(published_at))
+
+
+@receiver(page_published)
+def pregenerate_renditions(sender, instance, **kwargs):
+    if not getattr(settings, "RENDITION_PREGENERATION_ON_PUBLISH", True):
+        return
+    if isinstance(instance, BlogDetailPage):
+        # Wait for the publish to commit so the workers see the new revision
+        transaction.on_commit(lambda: pregenerate_page_renditions(instance))
+
+
+@receiver(post_page_move)
+def page_moved(sender, instance, parent_page_before, parent_page_after, **kwargs):
+    # A move changes the URL of the page and everything below it
+    descendant_pks = list(instance.get_descendants().values_list("pk", flat=True))
+    for pk in descendant_pks:
+        bump_generation("page", pk)
+    sitemaps.pages_changed([instance.pk] + descendant_pks)
+    page_changed(instance, parent=parent_page_after)
+    bump_generation("page", parent_page_before.pk)
+    bump_generation("api")
+    bump_generation("feed")
+
+
+@receiver(page_published)
+@receiver(post_page_move)
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def page_urls_changed(sender, **kwargs):
+    # A publish may carry a new slug, a move changes a whole subtree's paths
+    page_url_cache.invalidate()
+
+
+@receiver(page_published)
+@receiver(page_unpublished)
+@receiver(post_delete, sender=Page)
+def update_sitemap(sender, instance, **kwargs):
+    sitemaps.pages_changed([instance.pk])
+
+
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def update_sitemap_sites(sender, **kwargs):
+    sitemaps.sites_changed()
+
+
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def site_changed(sender, **kwargs):
+    # Cached pages and API payloads (html_url, the listing's posts) hold full
+    # URLs, and rendered content page URLs relative to a site
+    bump_generation("site")
+    bump_generation("page_cache")
+
+
+@receiver(post_delete, sender=Page)
+def page_deleted(sender, instance, **kwargs):
+    bump_generation("page", instance.pk)
+    bump_generation("search")
+    bump_generation("api")
+    bump_generation("feed")
+    try:
+        parent = instance.get_parent()
+    except Page.DoesNotExist:
+        # Deleted along with its parent
+        return
+    if parent is not None:
+        bump_generation("page", parent.pk)
+
+
+@receiver(post_save, sender=get_image_model())
+@receiver(post_delete, sender=get_image_model())
+def image_changed(sender, instance, **kwargs):
+    bump_generation("image", instance.pk)
+    # Any cached page may show this image
+    bump_generation("page_cache")
+
+
+@receiver(post_save, sender=PageViewRestriction)
+@receiver(post_delete, sender=PageViewRestriction)
+def view_restriction_changed(sender, instance, **kwargs):
+    # Listings (and the home page) only show public pages
+    try:
+        page = instance.page
+    except Page.DoesNotExist:
+        # Deleted along with its page
+        return
+    page_changed(page)
+
+
+@receiver(post_save, sender=get_document_model())
+@receiver(post_delete, sender=get_document_model())
+def document_changed(sender, instance, **kwargs):
+    # Rich text and blocks link to documents by a URL holding the file name
+    bump_generation("document")
+    bump_generation("page_cache")
+
+
+@receiver(post_save, sender=BlogAuthor)
+@receiver(post_delete, sender=BlogAuthor)
+@receiver(post_save, sender=BlogCategory)
+@receiver(post_delete, sender=BlogCategory)
+def snippet_changed(sender, instance, **kwargs):
+    # Authors and categories are shown on every post, listing and home page
+    bump_generation("page_cache")
@@ -1,3 +1,357 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from wagtail.images import get_image_model
+from wagtail.images.tests.utils import get_test_image_file
+
+from home.models import HomePage
+
+from . import facets
+from .models import (
+    ArticleBlogPage,
+    BlogAuthor,
+    BlogAuthorsOrderable,
+    BlogCategory,
+    BlogListingPage,
+    BlogRenderedContent,
+)
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    PAGE_CACHE_ENABLED=False,
+    RENDITION_PREGENERATION_ON_PUBLISH=False,
+    STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage",
+)
+class BlogTestCase(TestCase):
+    """A home page, a blog listing and three article posts with images and authors."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Image = get_image_model()
+        cls.images = [
+            Image.objects.create(title="Image {}".format(i), file=get_test_image_file())
+            for i in range(3)
+        ]
+        cls.authors = [
+            BlogAuthor.objects.create(name="Author {}".format(i), image=image)
+            for i, image in enumerate(cls.images)
+        ]
+
+        cls.home = HomePage.objects.get(slug="home")
+        cls.listing = cls.home.add_child(
+            instance=BlogListingPage(title="Blog", slug="blog", custom_title="Blog")
+        )
+        cls.posts = [
+            cls.listing.add_child(instance=ArticleBlogPage(
+                title="Post {}".format(i),
+                slug="post-{}".format(i),
+                custom_title="Post {}".format(i),
+                introduction="Introduction {}".format(i),
+                banner_image=image,
+                blog_authors=[BlogAuthorsOrderable(author=author) for author in cls.authors],
+            ))
+            for i, image in enumerate(cls.images)
+        ]
+
+        cls.home.coverstory_blog = cls.posts[0]
+        cls.home.featuredPost1_blog = cls.posts[1]
+        cls.home.featuredPost2_blog = cls.posts[2]
+        cls.home.blog_listing_section = cls.listing
+        cls.home.About_section_title = "About"
+        cls.home.About_section_text = "About this blog"
+        cls.home.save()
+
+    def setUp(self):
+        # Cached payloads and generations would otherwise outlive each test's data
+        cache.clear()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+class RenditionPrefetchTests(BlogTestCase):
+    def assertRenditionQueries(self, url, expected):
+        # The first request generates any missing renditions
+        self.assertEqual(self.client.get(url).status_code, 200)
+        caches["renditions"].clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        rendition_queries = [
+            query for query in queries.captured_queries
+            if "wagtailimages_rendition" in query["sql"]
+        ]
+        self.assertEqual(len(rendition_queries), expected)
+
+    def test_home_page_loads_renditions_in_one_query(self):
+        # 6 {% image %} tags: three featured posts and three blog section posts
+        self.assertRenditionQueries(self.home.url, 1)
+
+    def test_article_page_loads_renditions_in_one_query(self):
+        # Banner and three author avatars
+        self.assertRenditionQueries(self.posts[0].url, 1)
+
+    def test_renditions_are_read_from_the_cache(self):
+        self.client.get(self.home.url)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.home.url)
+
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if "wagtailimages_rendition" in query["sql"]
+        ])
+
+
+class APIQueryCountTests(BlogTestCase):
+    url = "/api/v2/pages/?type=blog.ArticleBlogPage&fields=blog_authors&limit={}"
+
+    def count_queries(self, limit):
+        # Drop cached API responses, keep the renditions cache warm
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url.format(limit))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["items"]), limit)
+        return len(queries)
+
+    def test_blog_authors_query_count_does_not_grow_with_results(self):
+        # Generate the fill-200x250 renditions first
+        self.client.get(self.url.format(3))
+
+        self.assertEqual(self.count_queries(1), self.count_queries(3))
+
+
+@override_settings(BLOG_CURSOR_PAGINATION=True)
+class CursorPaginationTests(BlogTestCase):
+    def test_pages_through_posts_that_were_never_published(self):
+        # The fixture's posts were added live, without a first_published_at
+        response = self.client.get(self.listing.url)
+        self.assertEqual(response.status_code, 200)
+        posts = response.context["posts"]
+        self.assertEqual([post.pk for post in posts], [self.posts[2].pk, self.posts[1].pk])
+        self.assertFalse(posts.has_previous())
+        self.assertTrue(posts.has_next())
+
+        response = self.client.get(self.listing.url, {"after": posts.next_cursor})
+        self.assertEqual(response.status_code, 200)
+        posts = response.context["posts"]
+        self.assertEqual([post.pk for post in posts], [self.posts[0].pk])
+        self.assertTrue(posts.has_previous())
+        self.assertFalse(posts.has_next())
+
+        response = self.client.get(self.listing.url, {"before": posts.previous_cursor})
+        self.assertEqual(
+            [post.pk for post in response.context["posts"]],
+            [self.posts[2].pk, self.posts[1].pk],
+        )
+
+    def test_api_posts_field_pages_through_posts_that_were_never_published(self):
+        url = "/api/v2/pages/{}/?fields=posts&posts_limit=2".format(self.listing.pk)
+        posts = self.client.get(url).json()["posts"]
+        self.assertEqual(
+            [item["id"] for item in posts["items"]], [self.posts[2].pk, self.posts[1].pk]
+        )
+
+        response = self.client.get(url, {"posts_after": posts["next_cursor"]})
+        posts = response.json()["posts"]
+        self.assertEqual([item["id"] for item in posts["items"]], [self.posts[0].pk])
+        self.assertIsNone(posts["next_cursor"])
+
+
+class APIDetailCacheTests(BlogTestCase):
+    def test_publishing_a_post_changes_the_listing_posts(self):
+        url = "/api/v2/pages/{}/?fields=posts".format(self.listing.pk)
+        response = self.client.get(url)
+        self.assertEqual(len(response.json()["posts"]["items"]), 3)
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        post = self.listing.add_child(instance=ArticleBlogPage(
+            title="Post 3",
+            slug="post-3",
+            custom_title="Post 3",
+            banner_image=self.images[0],
+            live=False,
+        ))
+        post.save_revision().publish()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        items = response.json()["posts"]["items"]
+        self.assertEqual(len(items), 4)
+        self.assertEqual(items[0]["id"], post.pk)
+
+
+class FacetCountTests(BlogTestCase):
+    def test_evicted_count_is_rebuilt(self):
+        self.assertEqual(facets.get_count(), 3)
+        cache.delete(facets.facet_key(facets.get_version(), "all"))
+
+        self.assertEqual(facets.get_count(), 3)
+
+    def test_unused_category_counts_zero_without_rebuilding(self):
+        category = BlogCategory.objects.create(name="Empty", slug="empty")
+        self.assertEqual(facets.get_category_counts([category.pk]), {category.pk: 0})
+        version = facets.get_version()
+
+        self.assertEqual(facets.get_category_counts([category.pk]), {category.pk: 0})
+        self.assertEqual(facets.get_version(), version)
+
+
+class ArchiveTests(BlogTestCase):
+    def test_archive_month_pages(self):
+        url = self.listing.url + self.listing.reverse_subpage("blogs_by_year", args=(2019, 7))
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(self.listing.url + "year/9998/12/").status_code, 200)
+
+    def test_category_page(self):
+        category = BlogCategory.objects.create(name="News", slug="news")
+        self.posts[0].categories.add(category)
+        self.posts[0].save()
+        url = self.listing.url + self.listing.reverse_subpage("category_view", args=("news",))
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["category"], category)
+        self.assertEqual([post.pk for post in response.context["posts"]], [self.posts[0].pk])
+        self.assertEqual(self.client.get(url.replace("news", "missing")).status_code, 404)
+
+    def test_archive_out_of_range_is_not_found(self):
+        for path in ["year/9999/12/", "year/9999/", "year/0/1/", "year/2019/13/"]:
+            response = self.client.get(self.listing.url + path)
+            self.assertEqual(response.status_code, 404, path)
+
+
+class SitemapTests(BlogTestCase):
+    def test_chunk_lists_the_listing_routes(self):
+        response = self.client.get("/sitemap-0.xml")
+        self.assertEqual(response.status_code, 200)
+        content = b"".join(response.streaming_content).decode()
+        self.assertIn(self.posts[0].full_url, content)
+        self.assertIn(
+            self.listing.full_url + self.listing.reverse_subpage("latest_posts"), content
+        )
+
+    def test_chunk_past_the_end_is_not_found(self):
+        self.assertEqual(self.client.get("/sitemap-100000.xml").status_code, 404)
+
+
+class PostsJSONTests(BlogTestCase):
+    def test_streams_every_post_newest_first(self):
+        url = self.listing.url + self.listing.reverse_subpage("posts_json")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        posts = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(
+            [post["id"] for post in posts], [post.pk for post in reversed(self.posts)]
+        )
+        self.assertEqual(posts[0]["url"], self.posts[2].url)
+
+
+class RenderedContentTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        BlogRenderedContent.store(self.posts[0])
+        # Tell the stored HTML apart from a live render
+        BlogRenderedContent.objects.filter(page=self.posts[0]).update(html="<p>Stored</p>")
+
+    def test_stored_html_is_served(self):
+        self.assertContains(self.client.get(self.posts[0].url), "<p>Stored</p>")
+
+    def test_preview_renders_live(self):
+        post = ArticleBlogPage.objects.get(pk=self.posts[0].pk)
+        self.assertNotContains(post.make_preview_request(), "<p>Stored</p>")
+
+    def test_unrelated_image_does_not_invalidate_stored_html(self):
+        get_image_model().objects.create(title="Unrelated", file=get_test_image_file())
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.posts[0].url)
+
+        self.assertContains(response, "<p>Stored</p>")
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if "blog_blogrenderedcontent" in query["sql"]
+            and query["sql"].lstrip().upper().startswith("UPDATE")
+        ])
+
+
+@override_settings(PAGE_CACHE_ENABLED=True)
+class PageCacheTests(BlogTestCase):
+    def test_miss_then_hit_then_not_modified(self):
+        response = self.client.get(self.listing.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Page-Cache"], "MISS")
+
+        response = self.client.get(self.listing.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Page-Cache"], "HIT")
+
+        response = self.client.get(self.listing.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_publishing_a_post_purges_the_listing_and_home_page(self):
+        urls = [self.listing.url, self.home.url]
+        for url in urls:
+            self.client.get(url)
+            self.assertEqual(self.client.get(url)["X-Page-Cache"], "HIT")
+
+        self.posts[0].save_revision().publish()
+
+        for url in urls:
+            self.assertEqual(self.client.get(url)["X-Page-Cache"], "MISS")
+
+    def test_logged_in_users_are_not_served_from_the_cache(self):
+        self.client.get(self.listing.url)
+        user = get_user_model().objects.create_user("editor", password="password")
+        self.client.force_login(user)
+
+        response = self.client.get(self.listing.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("X-Page-Cache"))
+
+
+class FeedTests(BlogTestCase):
+    def test_feeds_answer_conditional_requests(self):
+        self.posts[0].save_revision().publish()
+
+        for route_name in ["feed", "atom_feed"]:
+            url = self.listing.url + self.listing.reverse_subpage(route_name)
+            response = self.client.get(url)
+            self.assertContains(response, "Post 0")
+
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(not_modified.status_code, 304)
+            not_modified = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+            )
+            self.assertEqual(not_modified.status_code, 304)
+
+    def test_publishing_a_post_changes_the_feed(self):
+        url = self.listing.url + self.listing.reverse_subpage("feed")
+        etag = self.client.get(url)["ETag"]
+
+        self.posts[0].save_revision().publish()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
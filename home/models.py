@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from django.db import models
 from django.shortcuts import render
 
@@ -20,10 +21,17 @@ from wagtail.contrib.routable_page.models import RoutablePageMixin, route
 
 from rest_framework.fields import Field
 
+from blog.models import BlogDetailPage
+from blog.pagination import annotate_sort_date
+from blog.querysets import specific_prefetched
+from blog.renditions import prefetch_renditions
+from mysite.generations import get_generation, get_generations
+from mysite.page_cache import CachedPageMixin
+from mysite.page_urls import page_url_cache
 # from streams import blocks
 
 
-class HomePage(RoutablePageMixin, Page):
+class HomePage(CachedPageMixin, RoutablePageMixin, Page):
     """Home page model."""
     template = "home/home_page.html"
 
@@ -111,6 +119,99 @@ class HomePage(RoutablePageMixin, Page):
         ], heading="About Section"),
     ]
 
+    sections_cache_timeout = 60 * 60 * 24
+
+    def get_context(self, request, *args, **kwargs):
+        """Add the cover story, featured posts and blog section.
+
+        They are assembled once by get_sections() and cached until this page,
+        the blog section or one of the featured posts is published again."""
+        context = super().get_context(request, *args, **kwargs)
+        sections = cache.get_or_set(
+            self.get_sections_cache_key(), self.get_sections, self.sections_cache_timeout
+        )
+        context.update(sections)
+
+        prefetch_renditions(
+            (post["banner_image"], "fill-850x450-c50")
+            for post in [
+                sections["coverstory"],
+                sections["featured_post_1"],
+                sections["featured_post_2"],
+            ] + sections["blog_section_posts"]
+            if post is not None
+        )
+        return context
+
+    def get_sections_cache_key(self):
+        referenced = [
+            self.pk,
+            self.blog_listing_section_id,
+            self.coverstory_blog_id,
+            self.featuredPost1_blog_id,
+            self.featuredPost2_blog_id,
+        ]
+        generations = get_generations("page", [pk for pk in referenced if pk])
+        return "home:sections:{}:{}:{}".format(
+            self.pk,
+            get_generation("page_cache"),
+            "-".join("{}.{}".format(pk, generation) for pk, generation in generations.items()),
+        )
+
+    def get_sections(self):
+        """Load every post shown on the home page in one prefetch pass.
+
+        Posts come back as plain dicts so the result can be cached. The blog
+        section is evaluated once and shared by the main list and the
+        Archives sidebar."""
+        featured_ids = [
+            self.coverstory_blog_id,
+            self.featuredPost1_blog_id,
+            self.featuredPost2_blog_id,
+        ]
+        featured = {
+            post.pk: post for post in specific_prefetched(
+                BlogDetailPage.objects.filter(pk__in=[pk for pk in featured_ids if pk])
+            )
+        }
+
+        blog_section_posts = []
+        if self.blog_listing_section_id:
+            # Ordered like the blog listing, without its private posts
+            blog_section_posts = specific_prefetched(
+                annotate_sort_date(
+                    BlogDetailPage.objects.live().public()
+                    .child_of(self.blog_listing_section)
+                ).order_by("-sort_date", "-pk")
+            )[:5]
+
+        return {
+            "coverstory": self.get_post_summary(featured.get(self.coverstory_blog_id)),
+            "featured_post_1": self.get_post_summary(featured.get(self.featuredPost1_blog_id)),
+            "featured_post_2": self.get_post_summary(featured.get(self.featuredPost2_blog_id)),
+            "blog_section_posts": [
+                self.get_post_summary(post) for post in blog_section_posts
+            ],
+        }
+
+    @staticmethod
+    def get_post_summary(post):
+        """The fields of a blog post the home page template uses."""
+        if post is None:
+            return None
+        return {
+            "id": post.pk,
+            "title": post.title,
+            "custom_title": post.custom_title,
+            "url": page_url_cache.get_url(post),
+            "introduction": getattr(post, "introduction", None),
+            "date_published": getattr(post, "date_published", None),
+            "banner_image": post.banner_image,
+            "categories": [category.name for category in post.categories.all()],
+            "authors": [orderable.author_name for orderable in post.blog_authors.all()],
+            "has_content": bool(post.content),
+        }
+
     def __str__(self):
         return self.title
 
@@ -0,0 +1,137 @@
+"""Wagtail v2 API endpoints, mounted at /api/v2/ in mysite/urls.py."""
+import hashlib
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.utils.cache import get_conditional_response
+from rest_framework.response import Response
+
+from wagtail.api.v2.router import WagtailAPIRouter
+from wagtail.api.v2.serializers import PageHtmlUrlField, PageSerializer
+from wagtail.api.v2.views import PagesAPIViewSet
+from wagtail.documents.api.v2.views import DocumentsAPIViewSet
+from wagtail.images.api.v2.views import ImagesAPIViewSet
+
+from blog.renditions import prefetch_renditions
+
+from .generations import get_generation
+from .page_urls import page_url_cache
+
+
+def prefetch_api_relations(pages):
+    """Load what the serializers will read for a whole page of results.
+
+    Page models list their relations in ``api_prefetch_related`` and the
+    renditions their API fields render in ``get_api_renditions()``; both are
+    loaded with a constant number of queries however many pages there are.
+    """
+    pages_by_model = defaultdict(list)
+    for page in pages:
+        pages_by_model[type(page)].append(page)
+
+    renditions = []
+    for model, model_pages in pages_by_model.items():
+        lookups = getattr(model, "api_prefetch_related", None)
+        if lookups:
+            prefetch_related_objects(model_pages, *lookups)
+        if hasattr(model, "get_api_renditions"):
+            for page in model_pages:
+                renditions.extend(page.get_api_renditions())
+    prefetch_renditions(renditions)
+
+
+class CachedPageHtmlUrlField(PageHtmlUrlField):
+    def to_representation(self, page):
+        return page_url_cache.get_full_url(page)
+
+
+class CachedURLPageSerializer(PageSerializer):
+    """Builds ``meta.html_url`` from the process-wide PageURLCache."""
+
+    html_url = CachedPageHtmlUrlField(read_only=True)
+
+
+class CachedPagesAPIViewSet(PagesAPIViewSet):
+    """The pages endpoint, with cached payloads and conditional GET support.
+
+    A detail payload is cached per page, query string (so ``?fields=``
+    selects what is serialized and cached) and page generation, which is
+    bumped when the page or one of its children is published, unpublished
+    or moved. The cache key doubles as a strong ETag, so clients that poll
+    get a 304 until the payload changes. Listings are cached and ETagged
+    per query string until any page is published or unpublished.
+    """
+
+    base_serializer_class = CachedURLPageSerializer
+    cache_timeout = getattr(settings, "API_CACHE_TIMEOUT", 60 * 60 * 24)
+
+    # Paging parameters of BlogListingPage's "posts" field
+    known_query_parameters = PagesAPIViewSet.known_query_parameters.union([
+        "posts_limit",
+        "posts_after",
+    ])
+
+    def get_cache_key(self, request, *parts):
+        raw_key = "|".join(
+            [request.get_host(), request.path, request.GET.urlencode()]
+            + [str(part) for part in parts]
+        )
+        return hashlib.md5(raw_key.encode("utf-8")).hexdigest()
+
+    def cached_response(self, request, key, serialize):
+        etag = '"{}"'.format(key)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        cache_key = "api:{}".format(key)
+        data = cache.get(cache_key)
+        if data is None:
+            data = serialize()
+            cache.set(cache_key, data, self.cache_timeout)
+
+        response = Response(data)
+        response["ETag"] = etag
+        return response
+
+    def detail_view(self, request, pk):
+        instance = self.get_object()
+        # Fields like BlogListingPage.posts read the children, whose publishing
+        # bumps this page's generation too (see blog/signals.py); images and
+        # snippets embedded in the payload change without a publish
+        key = self.get_cache_key(
+            request,
+            instance.pk,
+            get_generation("page", instance.pk),
+            get_generation("page_cache"),
+        )
+
+        def serialize():
+            prefetch_api_relations([instance])
+            return self.get_serializer(instance).data
+
+        return self.cached_response(request, key, serialize)
+
+    def paginate_queryset(self, queryset):
+        pages = list(super().paginate_queryset(queryset))
+        prefetch_api_relations(pages)
+        return pages
+
+    def listing_view(self, request):
+        key = self.get_cache_key(
+            request, get_generation("api"), get_generation("page_cache")
+        )
+        return self.cached_response(
+            request,
+            key,
+            lambda: super(CachedPagesAPIViewSet, self).listing_view(request).data,
+        )
+
+
+api_router = WagtailAPIRouter("wagtailapi")
+
+api_router.register_endpoint("pages", CachedPagesAPIViewSet)
+api_router.register_endpoint("images", ImagesAPIViewSet)
+api_router.register_endpoint("documents", DocumentsAPIViewSet)
@@ -0,0 +1,121 @@
+"""Generation counters for cache invalidation.
+
+Rather than deleting cached entries when something changes, cache keys embed
+the generation of every object they were built from. Bumping a generation
+makes the old entries unreachable and they are left to expire, so long
+timeouts stay safe and no code path has to know every key to delete.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+
+
+def generation_key(scope, pk=None):
+    if pk is None:
+        return "generation:{}".format(scope)
+    return "generation:{}:{}".format(scope, pk)
+
+
+def _initial_generation():
+    # Seeded from the clock so a counter that was evicted from the cache never
+    # restarts at a value that old entries were already keyed with.
+    return int(time.time() * 1000)
+
+
+def get_generation(scope, pk=None):
+    """Return the current generation of ``scope`` (optionally of one object)."""
+    key = generation_key(scope, pk)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _initial_generation(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def get_generations(scope, pks):
+    """Return ``{pk: generation}`` for several objects with one cache round trip."""
+    keys = {generation_key(scope, pk): pk for pk in pks}
+    found = cache.get_many(keys.keys())
+    generations = {}
+    for key, pk in keys.items():
+        if key in found:
+            generations[pk] = found[key]
+        else:
+            generations[pk] = get_generation(scope, pk)
+    return generations
+
+
+# Seconds between checks of a shared generation by in-process structures
+GENERATION_CHECK_INTERVAL = 1.0
+
+
+class LocalGeneration:
+    """The generation an in-process structure was built at.
+
+    ``check()`` reads the shared generation at most once every
+    GENERATION_CHECK_INTERVAL seconds (always while nothing is built yet),
+    so per-process indexes notice changes made by other processes without a
+    cache round trip per lookup.
+    """
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.current = None
+        self._checked_at = 0.0
+
+    def check(self):
+        """Return the shared generation if it is due for a check, else None."""
+        now = time.monotonic()
+        if self.current is not None and now - self._checked_at < GENERATION_CHECK_INTERVAL:
+            return None
+        self._checked_at = now
+        return get_generation(self.scope)
+
+    def reset(self):
+        """Check (and rebuild) on the next lookup."""
+        self.current = None
+        self._checked_at = 0.0
+
+
+def bump_generation(scope, pk=None):
+    """Invalidate everything keyed on ``scope`` (optionally on one object)."""
+    key = generation_key(scope, pk)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Not in the cache (never read, or evicted); start a fresh counter
+        generation = _initial_generation()
+        cache.set(key, generation, None)
+        return generation
+
+
+# Global scopes that rendered content linking to pages, images and documents
+# depends on: Site edits change page URLs, document edits their file URLs
+CONTENT_SCOPES = ("site", "document")
+
+
+def get_dependency_generations(page_ids, image_ids, scopes=CONTENT_SCOPES):
+    """Look up the generations ``dependencies_hash`` needs for a batch at once."""
+    return {
+        "page": get_generations("page", page_ids),
+        "image": get_generations("image", image_ids),
+        "scopes": [get_generation(scope) for scope in scopes],
+    }
+
+
+def dependencies_hash(page_ids, image_ids, generations=None):
+    """A hash that changes when any of these pages or images (or the content
+    scopes) change, for cache keys and stored renders.
+
+    ``generations`` can be a ``get_dependency_generations`` result covering
+    these ids, so a batch of keys costs one lookup per type.
+    """
+    if generations is None:
+        generations = get_dependency_generations(page_ids, image_ids)
+    key = (
+        [(pk, generations["page"][pk]) for pk in sorted(page_ids)],
+        [(pk, generations["image"][pk]) for pk in sorted(image_ids)],
+        generations["scopes"],
+    )
+    return hashlib.md5(repr(key).encode("utf-8")).hexdigest()
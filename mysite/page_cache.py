@@ -0,0 +1,117 @@
+"""Full-page response cache for pages served to anonymous visitors.
+
+Keys combine the site, the request path (which covers RoutablePageMixin
+sub-routes), the query parameters that change what a page shows and the
+generation of the page being served. Publishing a page bumps the generation
+of the page, its parent and the site's home page, so their cached responses
+are never served again; nothing has to be deleted explicitly.
+
+Cached responses carry an ETag derived from their key (unless the view set
+its own), so clients revalidating a cached page get a 304.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from wagtail.core.models import Site
+
+from .generations import get_generation
+
+# Query parameters that change the content of a page; everything else
+# (utm_source and friends) shares the same cache entry.
+VARY_ON_PARAMS = ("page", "tag", "after", "before")
+
+HITS_KEY = "page_cache:hits"
+MISSES_KEY = "page_cache:misses"
+
+
+def is_cacheable(request):
+    """Only anonymous GET/HEAD requests for live content are cached."""
+    return (
+        getattr(settings, "PAGE_CACHE_ENABLED", True)
+        and request.method in ("GET", "HEAD")
+        and not getattr(request, "is_preview", False)
+        and not request.user.is_authenticated
+    )
+
+
+def page_cache_key(page, request):
+    site = Site.find_for_request(request)
+    params = "&".join(
+        "{}={}".format(name, value)
+        for name in VARY_ON_PARAMS
+        for value in request.GET.getlist(name)
+    )
+    raw_key = "{}|{}|{}|{}".format(
+        site.pk if site else "",
+        request.path,
+        params,
+        "ajax" if request.is_ajax() else "",
+    )
+    return "page_cache:{}:{}:{}".format(
+        get_generation("page_cache"),
+        get_generation("page", page.pk),
+        hashlib.md5(raw_key.encode("utf-8")).hexdigest(),
+    )
+
+
+def _count(key):
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def get_stats():
+    """Return the hit/miss counters collected since the last reset."""
+    hits = cache.get(HITS_KEY) or 0
+    misses = cache.get(MISSES_KEY) or 0
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / total if total else 0.0,
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+class CachedPageMixin:
+    """Serve anonymous requests for this page type from the page cache."""
+
+    def serve(self, request, *args, **kwargs):
+        if not is_cacheable(request):
+            return super().serve(request, *args, **kwargs)
+
+        key = page_cache_key(self, request)
+        response = cache.get(key)
+        if response is not None:
+            _count(HITS_KEY)
+            response["X-Page-Cache"] = "HIT"
+            return get_conditional_response(
+                request,
+                etag=response.get("ETag"),
+                last_modified=parse_http_date_safe(response.get("Last-Modified", "")),
+                response=response,
+            )
+
+        _count(MISSES_KEY)
+        response = super().serve(request, *args, **kwargs)
+        response["X-Page-Cache"] = "MISS"
+        if response.status_code == 200 and not response.streaming and not response.cookies:
+            if not response.has_header("ETag"):
+                response["ETag"] = '"{}"'.format(hashlib.md5(key.encode("utf-8")).hexdigest())
+            timeout = getattr(settings, "PAGE_CACHE_TIMEOUT", 60 * 60 * 24)
+            if hasattr(response, "render") and not response.is_rendered:
+                response.add_post_render_callback(
+                    lambda rendered: cache.set(key, rendered, timeout)
+                )
+            else:
+                cache.set(key, response, timeout)
+        return response
@@ -0,0 +1,143 @@
+"""Page URLs built from ``url_path`` without loading Page objects.
+
+``Page.url`` fetches the site root paths and reverses ``wagtail_serve`` on
+every call. SiteRootMap does both once, after which the URL of any page can
+be computed from the ``url_path`` column alone, e.g. from a ``values()``
+query. PageURLCache keeps one of them per process, for all requests.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.urls import reverse
+
+from wagtail.core.models import Page, Site
+
+from .generations import LocalGeneration, bump_generation
+
+
+class SiteRootMap:
+    def __init__(self):
+        # (site_id, root_path, root_url); the deepest root path wins
+        self.root_paths = sorted(
+            ((root[0], root[1], root[2]) for root in Site.get_site_root_paths()),
+            key=lambda root: len(root[1]),
+            reverse=True,
+        )
+        self.num_sites = len({site_id for site_id, root_path, root_url in self.root_paths})
+        self.serve_prefix = reverse("wagtail_serve", args=("",))
+        self.append_slash = getattr(settings, "WAGTAIL_APPEND_SLASH", True)
+
+    def get_url_parts(self, url_path):
+        """Return ``(site_id, root_url, page_path)`` like ``Page.get_url_parts``."""
+        for site_id, root_path, root_url in self.root_paths:
+            if url_path.startswith(root_path):
+                page_path = self.serve_prefix + url_path[len(root_path):]
+                if not self.append_slash and page_path != "/":
+                    page_path = page_path.rstrip("/")
+                return site_id, root_url, page_path
+        return None
+
+    def get_url(self, url_path, current_site=None):
+        """Same result as ``Page.get_url``: relative unless there are several sites."""
+        url_parts = self.get_url_parts(url_path)
+        if url_parts is None:
+            return None
+        site_id, root_url, page_path = url_parts
+        if self.num_sites == 1 or (current_site is not None and current_site.pk == site_id):
+            return page_path
+        return root_url + page_path
+
+    def get_full_url(self, url_path):
+        url_parts = self.get_url_parts(url_path)
+        if url_parts is None:
+            return None
+        site_id, root_url, page_path = url_parts
+        return root_url + page_path
+
+
+class PageURLCache:
+    """Process-wide page URLs, looked up by page (or page id).
+
+    Holds a SiteRootMap and the ``url_path`` of the PAGE_URL_CACHE_SIZE
+    pages most recently looked up by id, so building a URL is a dict lookup
+    plus a prefix match. Page moves, publishes (which is when a slug change
+    takes effect) and Site edits call ``invalidate()`` (see
+    blog/signals.py), which bumps the "page_urls" generation; every process
+    checks it at most once a second and starts over when it changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._url_paths = OrderedDict()
+        self.max_size = getattr(settings, "PAGE_URL_CACHE_SIZE", 10000)
+        self._site_roots = None
+        self._generation = LocalGeneration("page_urls")
+
+    def _ensure_current(self):
+        generation = self._generation.check()
+        if generation is None:
+            return
+        with self._lock:
+            if generation != self._generation.current:
+                self._url_paths = OrderedDict()
+                self._site_roots = SiteRootMap()
+                self._generation.current = generation
+
+    def invalidate(self):
+        bump_generation("page_urls")
+        with self._lock:
+            # Start over on the next lookup
+            self._generation.reset()
+
+    @property
+    def site_roots(self):
+        self._ensure_current()
+        return self._site_roots
+
+    def prime(self, pks):
+        """Load the url_path of several pages with one query."""
+        self._ensure_current()
+        with self._lock:
+            url_paths = self._url_paths
+            missing = set()
+            for pk in pks:
+                if pk in url_paths:
+                    url_paths.move_to_end(pk)
+                else:
+                    missing.add(pk)
+        if missing:
+            loaded = list(Page.objects.filter(pk__in=missing).values_list("pk", "url_path"))
+            with self._lock:
+                url_paths.update(loaded)
+                # Least recently used first
+                while len(url_paths) > self.max_size:
+                    url_paths.popitem(last=False)
+
+    def get_url_path(self, page):
+        if isinstance(page, Page):
+            # The instance's own path, as Page.url would use it (e.g. a preview)
+            return page.url_path
+        self.prime([page])
+        with self._lock:
+            return self._url_paths.get(page)
+
+    def get_url(self, page, current_site=None):
+        """Same result as ``page.get_url(current_site=...)`` for a page or page id."""
+        if page is None:
+            return None
+        url_path = self.get_url_path(page)
+        if url_path is None:
+            return None
+        return self.site_roots.get_url(url_path, current_site)
+
+    def get_full_url(self, page):
+        if page is None:
+            return None
+        url_path = self.get_url_path(page)
+        if url_path is None:
+            return None
+        return self.site_roots.get_full_url(url_path)
+
+
+page_url_cache = PageURLCache()
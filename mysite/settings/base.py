@@ -30,6 +30,7 @@ INSTALLED_APPS = [
     'streams',
     'blog',
 
+    'wagtail.api.v2',
     'wagtail.contrib.forms',
     'wagtail.contrib.redirects',
     'wagtail.embeds',
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
 
     'modelcluster',
     'taggit',
+    'rest_framework',
 
     'django.contrib.admin',
     'django.contrib.auth',
@@ -99,6 +101,27 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+#
+# Cached fragments and pages are invalidated through generation counters
+# (see mysite/generations.py). Every process must see the same counters, so
+# production overrides this with a shared backend.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Image rendition lookups, read by the {% image %} tag and warmed in bulk
+    # by blog.renditions.prefetch_renditions
+    'renditions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'renditions',
+        'TIMEOUT': 60 * 60,
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -165,10 +188,81 @@ WAGTAIL_SITE_NAME = "mysite"
 # BASE_URL = 'http://example.com'
 
 
+# Blog settings
+
+# Page the blog listing with opaque ?after= / ?before= tokens on
+# (published date, id) instead of ?page=x. Deep pages then cost the same
+# as page 1 and no COUNT(*) runs per request.
+BLOG_CURSOR_PAGINATION = False
+
+# Serve anonymous GET requests for blog and home pages from the page cache.
+PAGE_CACHE_ENABLED = True
+
+# Generate the image renditions a blog post needs in background threads
+# when it is published, instead of on the first request.
+# "manage.py pregenerate_renditions" does the same for all live posts.
+RENDITION_PREGENERATION_ON_PUBLISH = True
+RENDITION_PREGENERATION_WORKERS = 2
+
+# Number of posts in the blog listing's RSS/Atom feeds (/feed/, /feed/atom/).
+BLOG_FEED_ITEMS = 20
+
+# Number of page url_paths each process keeps for building page URLs
+# (mysite/page_urls.py); the least recently used are dropped first.
+PAGE_URL_CACHE_SIZE = 10000
+
+
+# Search settings
+
+# Search hits are counted in memory and written to Wagtail's search statistics
+# once this many distinct queries are buffered, or after this many seconds.
+SEARCH_HITS_BUFFER_SIZE = 100
+SEARCH_HITS_FLUSH_INTERVAL = 10
+
+
+# Sitemap settings
+
+# /sitemap.xml is an index of /sitemap-<n>.xml files, each covering this many
+# page ids.
+SITEMAP_CHUNK_SIZE = 5000
+
+
+# Cache timeouts
+
+# Cached entries are keyed on the generations of what they were built from
+# (mysite/generations.py) and are never served once one of those changes,
+# so these timeouts only bound how long unused entries are kept.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24           # Pages, until they or a child is published
+BLOG_FEED_CACHE_TIMEOUT = 60 * 60 * 24      # Feed XML, until a post is (un)published or moved
+RICHTEXT_CACHE_TIMEOUT = 60 * 60 * 24       # Rich text, until a linked page or image changes
+BLOCK_RENDER_CACHE_TIMEOUT = 60 * 60 * 24   # StreamField blocks, likewise
+API_CACHE_TIMEOUT = 60 * 60 * 24            # v2 API payloads, until a page or child is published
+SEARCH_RESULTS_CACHE_TIMEOUT = 60 * 60      # Result ids per query, until a page is published
+SITEMAP_CACHE_TIMEOUT = 60 * 60 * 24        # Sitemap chunks, until a page in them changes
+
+
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATIC_URL = '/static/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
-django_heroku.settings(locals())
\ No newline at end of file
+django_heroku.settings(locals())
+
+
+# Search backend
+# https://docs.wagtail.io/en/v2.11.3/reference/contrib/postgres_search.html
+#
+# On PostgreSQL (Heroku) use the tsvector based backend: ranked results, with
+# the boosts from the page models' search_fields, served from a GIN index.
+# Populate it once with "manage.py update_index"; page saves keep it current.
+# Elsewhere (the SQLite dev database) Wagtail's database backend is used.
+
+if 'postgresql' in DATABASES['default']['ENGINE']:
+    INSTALLED_APPS.append('wagtail.contrib.postgres_search')
+    WAGTAILSEARCH_BACKENDS = {
+        'default': {
+            'BACKEND': 'wagtail.contrib.postgres_search.backend',
+            'SEARCH_CONFIG': 'english',
+        },
+    }
@@ -1,7 +1,49 @@
+import os
+
 from .base import *
 
 DEBUG = False
 
+# Shared between all web processes so cache generations bumped by a publish
+# are seen everywhere. Redis when the Heroku Redis add-on (or any server) is
+# configured through REDIS_URL, a database table otherwise; that table is
+# created by "manage.py createcachetable" in the Procfile's release step.
+# Rendition lookups are read on every {% image %} tag and are kept in memory.
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+        'renditions': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'renditions',
+            'TIMEOUT': 60 * 60,
+        },
+    }
+else:
+    # The database backend culls a third of the table whenever it holds more
+    # than MAX_ENTRIES (300 by default), which would keep evicting the
+    # generation counters and facet counts
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache_table',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        },
+        # Per process, so a deleted rendition may still be read by other
+        # processes until it times out; set REDIS_URL to share it
+        'renditions': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'renditions',
+            'TIMEOUT': 10 * 60,
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+    }
+
 try:
     from .local import *
 except ImportError:
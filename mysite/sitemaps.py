@@ -0,0 +1,187 @@
+"""A sitemap index split into chunks of page ids, mounted in mysite/urls.py.
+
+/sitemap.xml lists one /sitemap-<n>.xml per chunk of SITEMAP_CHUNK_SIZE
+page ids that has live, public pages on the current site, with the latest
+``last_published_at`` of the chunk as its lastmod. Each chunk is streamed
+from a ``values()`` query, its URLs built with the PageURLCache, so Page
+objects are only loaded for the few types described below and memory use
+doesn't grow with the number of pages. A chunk without pages is a 404.
+
+A chunk is cached until a page in it is published, unpublished, moved or
+deleted (its "sitemap" generation, see blog/signals.py); the index is
+cached until any page changes. Editing a Site drops both.
+
+Page types that override ``get_sitemap_urls`` (to leave themselves out or
+add RoutablePageMixin routes, like BlogListingPage) are loaded, one query
+per type for each batch of rows, and asked for their entries.
+"""
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models import F, Max
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.html import escape
+
+from wagtail.core.models import Page, Site
+
+from .generations import bump_generation, get_generation
+from .page_urls import page_url_cache
+
+CHUNK_SIZE = getattr(settings, "SITEMAP_CHUNK_SIZE", 5000)
+CACHE_TIMEOUT = getattr(settings, "SITEMAP_CACHE_TIMEOUT", 60 * 60 * 24)
+
+# Rows read (and custom pages loaded) at a time
+BATCH_SIZE = 2000
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+XMLNS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+
+
+def get_chunk(pk):
+    return pk // CHUNK_SIZE
+
+
+def pages_changed(pks):
+    """Drop the cached chunks holding these pages, and the index."""
+    for chunk in {get_chunk(pk) for pk in pks}:
+        bump_generation("sitemap", chunk)
+    bump_generation("sitemap_index")
+
+
+def sites_changed():
+    bump_generation("sitemap")
+    bump_generation("sitemap_index")
+
+
+def get_site_pages(site):
+    return Page.objects.live().public().filter(
+        url_path__startswith=site.root_page.url_path
+    )
+
+
+def get_chunk_pages(site, chunk):
+    return get_site_pages(site).filter(
+        pk__gte=chunk * CHUNK_SIZE, pk__lt=(chunk + 1) * CHUNK_SIZE
+    )
+
+
+def format_lastmod(lastmod):
+    return lastmod.date().isoformat() if lastmod else None
+
+
+def sitemap_index(request):
+    site = Site.find_for_request(request)
+    if site is None:
+        raise Http404
+
+    key = "sitemap:{}:{}:index:{}.{}".format(
+        site.pk, CHUNK_SIZE, get_generation("sitemap"), get_generation("sitemap_index")
+    )
+    content = cache.get(key)
+    if content is None:
+        chunks = get_site_pages(site).annotate(
+            chunk=F("pk") / CHUNK_SIZE
+        ).values("chunk").annotate(lastmod=Max("last_published_at")).order_by("chunk")
+
+        root_url = site.root_url
+        parts = [XML_HEADER, "<sitemapindex {}>\n".format(XMLNS)]
+        for row in chunks:
+            parts.append("<sitemap><loc>{}/sitemap-{}.xml</loc>".format(
+                escape(root_url), row["chunk"]
+            ))
+            if row["lastmod"]:
+                parts.append("<lastmod>{}</lastmod>".format(format_lastmod(row["lastmod"])))
+            parts.append("</sitemap>\n")
+        parts.append("</sitemapindex>\n")
+        content = "".join(parts)
+        cache.set(key, content, CACHE_TIMEOUT)
+
+    return HttpResponse(content, content_type="application/xml")
+
+
+def has_custom_sitemap_urls(model):
+    return model is not None and model.get_sitemap_urls is not Page.get_sitemap_urls
+
+
+def iter_batch_urls(rows, request):
+    site_roots = page_url_cache.site_roots
+    custom = defaultdict(list)
+    for row in rows:
+        row["model"] = ContentType.objects.get_for_id(row["content_type_id"]).model_class()
+        if has_custom_sitemap_urls(row["model"]):
+            custom[row["model"]].append(row["pk"])
+    pages = {}
+    for model, pks in custom.items():
+        pages.update(model.objects.in_bulk(pks))
+
+    for row in rows:
+        if has_custom_sitemap_urls(row["model"]):
+            page = pages.get(row["pk"])
+            for url in page.get_sitemap_urls(request) if page is not None else ():
+                yield url["location"], url.get("lastmod"), url.get("priority")
+            continue
+
+        location = site_roots.get_full_url(row["url_path"])
+        if location is None:
+            continue
+        yield location, row["last_published_at"] or row["latest_revision_created_at"], None
+
+
+def iter_chunk_urls(site, chunk, request):
+    """Yield ``(location, lastmod, priority)`` for the pages of one chunk."""
+    rows = get_chunk_pages(site, chunk).order_by("pk").values(
+        "pk", "url_path", "content_type_id", "last_published_at", "latest_revision_created_at"
+    ).iterator(chunk_size=BATCH_SIZE)
+    while True:
+        batch = list(islice(rows, BATCH_SIZE))
+        if not batch:
+            return
+        yield from iter_batch_urls(batch, request)
+
+
+def iter_chunk_xml(site, chunk, request, cache_key):
+    """Stream a chunk's <urlset>, caching the whole document once it is done."""
+    parts = []
+
+    def emit(part):
+        parts.append(part)
+        return part
+
+    yield emit(XML_HEADER)
+    yield emit("<urlset {}>\n".format(XMLNS))
+    for location, lastmod, priority in iter_chunk_urls(site, chunk, request):
+        entry = "<url><loc>{}</loc>".format(escape(location))
+        if lastmod:
+            entry += "<lastmod>{}</lastmod>".format(format_lastmod(lastmod))
+        if priority is not None:
+            entry += "<priority>{}</priority>".format(priority)
+        yield emit(entry + "</url>\n")
+    yield emit("</urlset>\n")
+
+    cache.set(cache_key, "".join(parts), CACHE_TIMEOUT)
+
+
+def sitemap_chunk(request, chunk):
+    site = Site.find_for_request(request)
+    if site is None:
+        raise Http404
+
+    key = "sitemap:{}:{}:chunk:{}:{}.{}".format(
+        site.pk,
+        CHUNK_SIZE,
+        chunk,
+        get_generation("sitemap"),
+        get_generation("sitemap", chunk),
+    )
+    content = cache.get(key)
+    if content is not None:
+        return HttpResponse(content, content_type="application/xml")
+    # Past the last chunk, or a gap in the ids; not listed in the index
+    if not get_chunk_pages(site, chunk).exists():
+        raise Http404
+    return StreamingHttpResponse(
+        iter_chunk_xml(site, chunk, request, key), content_type="application/xml"
+    )
@@ -8,13 +8,21 @@ from wagtail.documents import urls as wagtaildocs_urls
 
 from search import views as search_views
 
+from .api import api_router
+from .sitemaps import sitemap_chunk, sitemap_index
+
 urlpatterns = [
     path('django-admin/', admin.site.urls),
 
     path('admin/', include(wagtailadmin_urls)),
     path('documents/', include(wagtaildocs_urls)),
+    path('api/v2/', api_router.urls),
 
     path('search/', search_views.search, name='search'),
+    path('search/suggest/', search_views.suggest, name='search_suggest'),
+
+    path('sitemap.xml', sitemap_index, name='sitemap'),
+    path('sitemap-<int:chunk>.xml', sitemap_chunk, name='sitemap_chunk'),
 
 ]
 
@@ -0,0 +1,93 @@
+"""Buffered recording of search hits.
+
+Instead of writing a Query row and a QueryDailyHits row on every search,
+hits are counted in memory per ``(query, date)`` and written out in bulk,
+from a background thread, when the buffer gets big enough and after a few
+seconds. mysite/wsgi.py also flushes it when a web worker shuts down.
+"""
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from wagtail.search.models import Query, QueryDailyHits
+from wagtail.search.utils import normalise_query_string
+
+
+def write_hits(counts):
+    """Add ``{(query_string, date): hits}`` to Wagtail's search statistics."""
+    query_strings = {query_string for query_string, date in counts}
+    with transaction.atomic():
+        Query.objects.bulk_create(
+            [Query(query_string=query_string) for query_string in query_strings],
+            ignore_conflicts=True,
+        )
+        queries = Query.objects.in_bulk(query_strings, field_name="query_string")
+
+        # Make sure every row exists, then increment them all
+        QueryDailyHits.objects.bulk_create(
+            [
+                QueryDailyHits(query=queries[query_string], date=date, hits=0)
+                for query_string, date in counts
+            ],
+            ignore_conflicts=True,
+        )
+        for (query_string, date), hits in counts.items():
+            QueryDailyHits.objects.filter(
+                query=queries[query_string], date=date
+            ).update(hits=F("hits") + hits)
+
+
+class HitBuffer:
+    """Collects search hits in memory and writes them out in bulk."""
+
+    def __init__(self, max_size, interval):
+        self.max_size = max_size
+        self.interval = interval
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def add(self, query_string):
+        query_string = normalise_query_string(query_string)[:255]
+        if not query_string:
+            return
+        with self._lock:
+            self._counts[(query_string, timezone.now().date())] += 1
+            if len(self._counts) == self.max_size:
+                # Full: written out from a thread right away, never by the request
+                self._schedule(0)
+            elif self._timer is None:
+                self._schedule(self.interval)
+
+    def _schedule(self, delay):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._flush_from_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if counts:
+            write_hits(counts)
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread got its own connection; don't leak it
+            connection.close()
+
+
+hit_buffer = HitBuffer(
+    max_size=getattr(settings, "SEARCH_HITS_BUFFER_SIZE", 100),
+    interval=getattr(settings, "SEARCH_HITS_FLUSH_INTERVAL", 10),
+)
@@ -0,0 +1,163 @@
+"""Search-as-you-type suggestions from an in-process prefix index.
+
+The index is a sorted list of ``(term, label, source)`` tuples, so a prefix
+lookup is a binary search followed by a short scan. Terms are the
+normalised label and each of its word suffixes, so "dja" finds "Learn
+Django". Labels are live blog post titles and custom titles, the tags used
+on blog posts and the blog category names. Suggestions are ranked by the
+hit counts Wagtail keeps for searches with the same text.
+
+Publishing, unpublishing and snippet edits bump the "suggestions"
+generation and put the changed labels in the cache under the new
+generation. Every process (the one that made the change included) applies
+the entries between its generation and the shared one to its index in
+place; only a process that finds one missing (it fell too far behind, or
+the entry was evicted) rebuilds the whole index. The hit counts are
+reloaded at most every WEIGHTS_MAX_AGE seconds.
+"""
+import bisect
+import threading
+import time
+
+from django.core.cache import cache
+from wagtail.search.models import Query
+from wagtail.search.utils import normalise_query_string
+
+from blog.models import BlogCategory, BlogDetailPage, BlogPageTag
+from mysite.generations import LocalGeneration, bump_generation, get_generation
+
+# How many matching terms are ranked before the best ones are returned
+MAX_CANDIDATES = 200
+
+# Changes kept for other processes to apply, and for how long; a process
+# further behind rebuilds
+MAX_CHANGES = 100
+CHANGE_TIMEOUT = 60 * 60
+
+# Seconds between reloads of the search hit counts
+WEIGHTS_MAX_AGE = 60 * 60
+
+
+def change_key(generation):
+    return "suggestions:change:{}".format(generation)
+
+
+def get_terms(label):
+    words = normalise_query_string(label).split()
+    return {" ".join(words[i:]) for i in range(len(words))}
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = []
+        self._sources = {}
+        self._weights = {}
+        self._weights_loaded_at = 0.0
+        self._generation = LocalGeneration("suggestions")
+
+    def _load_sources(self):
+        sources = {}
+        for pk, title, custom_title in BlogDetailPage.objects.live().public().values_list(
+            "pk", "title", "custom_title"
+        ):
+            sources[("page", pk)] = {title, custom_title}
+        for pk, name in BlogPageTag.objects.values_list("tag_id", "tag__name").distinct():
+            sources[("tag", pk)] = {name}
+        for pk, name in BlogCategory.objects.values_list("pk", "name"):
+            sources[("category", pk)] = {name}
+        return sources
+
+    def _load_weights(self):
+        return {
+            query.query_string: query._hits
+            for query in Query.get_most_popular()[:1000]
+        }
+
+    def rebuild(self):
+        # Read first: changes made while loading are applied from the cache later
+        generation = get_generation("suggestions")
+        sources = self._load_sources()
+        weights = self._load_weights()
+        entries = sorted(
+            (term, label, source)
+            for source, labels in sources.items()
+            for label in labels if label
+            for term in get_terms(label)
+        )
+        with self._lock:
+            self._entries = entries
+            self._sources = {source: set(labels) for source, labels in sources.items()}
+            self._weights = weights
+            self._weights_loaded_at = time.monotonic()
+            self._generation.current = generation
+
+    def _replace_source(self, source, labels):
+        for label in self._sources.pop(source, ()):
+            for term in get_terms(label):
+                entry = (term, label, source)
+                i = bisect.bisect_left(self._entries, entry)
+                if i < len(self._entries) and self._entries[i] == entry:
+                    del self._entries[i]
+        for label in labels:
+            for term in get_terms(label):
+                bisect.insort(self._entries, (term, label, source))
+        if labels:
+            self._sources[source] = set(labels)
+
+    def _catch_up(self, generation):
+        """Apply the changes up to ``generation``; False if some are missing."""
+        with self._lock:
+            current = self._generation.current
+            if current is None or not 0 <= generation - current <= MAX_CHANGES:
+                return False
+            keys = [change_key(g) for g in range(current + 1, generation + 1)]
+            changes = cache.get_many(keys)
+            if len(changes) < len(keys):
+                return False
+            for key in keys:
+                self._replace_source(*changes[key])
+            self._generation.current = generation
+            return True
+
+    def _ensure_current(self):
+        generation = self._generation.check()
+        if generation is not None and generation != self._generation.current:
+            if not self._catch_up(generation):
+                self.rebuild()
+                return
+        if time.monotonic() - self._weights_loaded_at > WEIGHTS_MAX_AGE:
+            weights = self._load_weights()
+            with self._lock:
+                self._weights = weights
+                self._weights_loaded_at = time.monotonic()
+
+    def update_source(self, source, labels):
+        """Replace the labels of one page, tag or category, in every process."""
+        labels = sorted({label for label in labels if label})
+        generation = bump_generation("suggestions")
+        cache.set(change_key(generation), (source, labels), CHANGE_TIMEOUT)
+        # Apply it here right away (along with anything missed before it)
+        if self._generation.current is not None:
+            self._catch_up(generation)
+
+    def remove_source(self, source):
+        self.update_source(source, [])
+
+    def suggest(self, prefix, limit=10):
+        prefix = normalise_query_string(prefix)
+        if not prefix:
+            return []
+        self._ensure_current()
+        with self._lock:
+            i = bisect.bisect_left(self._entries, (prefix,))
+            candidates = {}
+            for term, label, source in self._entries[i:i + MAX_CANDIDATES]:
+                if not term.startswith(prefix):
+                    break
+                candidates[label] = self._weights.get(normalise_query_string(label), 0)
+        ranked = sorted(candidates.items(), key=lambda item: (-item[1], item[0]))
+        return [label for label, weight in ranked[:limit]]
+
+
+suggestion_index = PrefixIndex()
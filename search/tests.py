@@ -0,0 +1,90 @@
+import datetime
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from wagtail.search.models import Query, QueryDailyHits
+
+from blog.models import BlogCategory
+
+from .hits import HitBuffer, write_hits
+from .suggest import PrefixIndex, change_key, suggestion_index
+
+
+class WriteHitsTests(TestCase):
+    def test_write_hits_creates_and_increments_daily_hits(self):
+        today = datetime.date(2020, 1, 2)
+        yesterday = datetime.date(2020, 1, 1)
+
+        write_hits({("django", today): 2})
+        write_hits({("django", today): 3, ("django", yesterday): 1, ("wagtail", today): 1})
+
+        def hits(query_string, date):
+            return QueryDailyHits.objects.get(
+                query__query_string=query_string, date=date
+            ).hits
+
+        self.assertEqual(Query.objects.filter(query_string="django").count(), 1)
+        self.assertEqual(hits("django", today), 5)
+        self.assertEqual(hits("django", yesterday), 1)
+        self.assertEqual(hits("wagtail", today), 1)
+
+
+class HitBufferTests(TestCase):
+    def test_full_buffer_is_written_from_another_thread(self):
+        written = threading.Event()
+        writers = []
+
+        def record(counts):
+            writers.append((threading.current_thread(), dict(counts)))
+            written.set()
+
+        buffer = HitBuffer(max_size=2, interval=60)
+        with mock.patch("search.hits.write_hits", side_effect=record):
+            buffer.add("django")
+            buffer.add("wagtail")
+            self.assertTrue(written.wait(5))
+
+        thread, counts = writers[0]
+        self.assertIsNot(thread, threading.current_thread())
+        self.assertEqual({query for query, date in counts}, {"django", "wagtail"})
+
+
+class SuggestTests(TestCase):
+    def test_suggestions_are_ranked_by_search_hits(self):
+        BlogCategory.objects.create(name="Posts", slug="posts")
+        BlogCategory.objects.create(name="Pottery", slug="pottery")
+        Query.get("pottery").add_hit()
+        # The hit counts are read when the index is built
+        suggestion_index.rebuild()
+
+        response = self.client.get("/search/suggest/?query=po")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["suggestions"], ["Pottery", "Posts"])
+
+
+@mock.patch("mysite.generations.GENERATION_CHECK_INTERVAL", 0)
+class SuggestionIndexTests(TestCase):
+    def setUp(self):
+        # Two processes' indexes
+        self.index, self.other = PrefixIndex(), PrefixIndex()
+        self.index.rebuild()
+        self.other.rebuild()
+
+    def test_changes_are_applied_without_rebuilding(self):
+        self.other.update_source(("category", 1), ["Pottery"])
+
+        with mock.patch.object(self.index, "rebuild") as rebuild:
+            self.assertEqual(self.index.suggest("pot"), ["Pottery"])
+        rebuild.assert_not_called()
+
+    def test_missing_change_rebuilds(self):
+        self.other.update_source(("category", 1), ["Pottery"])
+        cache.delete(change_key(self.other._generation.current))
+
+        with mock.patch.object(self.index, "rebuild", wraps=self.index.rebuild) as rebuild:
+            self.index.suggest("pot")
+        rebuild.assert_called_once_with()
@@ -1,8 +1,39 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.http import JsonResponse
 from django.template.response import TemplateResponse
 
 from wagtail.core.models import Page
-from wagtail.search.models import Query
+from wagtail.search.utils import normalise_query_string
+
+from mysite.generations import get_generation
+
+from .hits import hit_buffer
+from .suggest import suggestion_index
+
+# Upper bound on the number of results kept for a query
+MAX_CACHED_RESULTS = 1000
+
+
+def get_search_result_ids(search_query):
+    """Return the ids of the pages matching ``search_query``, best match first.
+
+    Cached per normalised query string until a page is published or
+    unpublished (which bumps the "search" generation)."""
+    normalised = normalise_query_string(search_query)
+    key = "search:results:{}:{}".format(
+        get_generation("search"),
+        hashlib.md5(normalised.encode("utf-8")).hexdigest(),
+    )
+    ids = cache.get(key)
+    if ids is None:
+        results = Page.objects.live().search(search_query)[:MAX_CACHED_RESULTS]
+        ids = [page.pk for page in results]
+        cache.set(key, ids, getattr(settings, "SEARCH_RESULTS_CACHE_TIMEOUT", 60 * 60))
+    return ids
 
 
 def search(request):
@@ -11,13 +42,12 @@ def search(request):
 
     # Search
     if search_query:
-        search_results = Page.objects.live().search(search_query)
-        query = Query.get(search_query)
+        search_results = get_search_result_ids(search_query)
 
-        # Record hit
-        query.add_hit()
+        # Record hit; written to the database in bulk by the buffer
+        hit_buffer.add(search_query)
     else:
-        search_results = Page.objects.none()
+        search_results = []
 
     # Pagination
     paginator = Paginator(search_results, 10)
@@ -28,7 +58,27 @@ def search(request):
     except EmptyPage:
         search_results = paginator.page(paginator.num_pages)
 
+    # Only the pages on this result page are loaded, in one query
+    pages = Page.objects.in_bulk(search_results.object_list)
+    search_results.object_list = [
+        pages[pk] for pk in search_results.object_list if pk in pages
+    ]
+
     return TemplateResponse(request, 'search/search.html', {
         'search_query': search_query,
         'search_results': search_results,
     })
+
+
+def suggest(request):
+    """Autocomplete suggestions for ?query=, served from the in-memory index."""
+    search_query = request.GET.get('query', '')
+    try:
+        limit = min(int(request.GET.get('limit', 10)), 50)
+    except ValueError:
+        limit = 10
+
+    return JsonResponse({
+        'query': search_query,
+        'suggestions': suggestion_index.suggest(search_query, limit=limit),
+    })
@@ -1,9 +1,50 @@
 """Streamfields live in here."""
 
 from wagtail.core import blocks
-from wagtail.core.templatetags.wagtailcore_tags import richtext
 from wagtail.images.blocks import ImageChooserBlock
 
+from mysite.page_urls import page_url_cache
+
+from .render_cache import CachedRenderMixin
+from .richtext import expand_richtext
+
+
+def bulk_to_python(block, values):
+    """Convert many raw values of ``block`` at once.
+
+    Struct and list values are taken apart so the chooser blocks inside
+    them convert all their ids together: one query per chooser model
+    instead of one per value.
+    """
+    values = list(values)
+    if isinstance(block, blocks.StructBlock):
+        converted = {
+            name: iter(bulk_to_python(
+                child_block, [value[name] for value in values if name in value]
+            ))
+            for name, child_block in block.child_blocks.items()
+        }
+        return [
+            block.meta.value_class(block, [
+                (name, next(converted[name]) if name in value else child_block.get_default())
+                for name, child_block in block.child_blocks.items()
+            ])
+            for value in values
+        ]
+    if isinstance(block, blocks.ListBlock):
+        converted = iter(bulk_to_python(
+            block.child_block, [item for value in values for item in value]
+        ))
+        return [[next(converted) for item in value] for value in values]
+    return block.bulk_to_python(values)
+
+
+class BulkStructMixin:
+    """Convert all instances of a struct block in a StreamField together."""
+
+    def bulk_to_python(self, values):
+        return bulk_to_python(self, values)
+
 
 class TitleAndTextBlock(blocks.StructBlock):
     """Title and text and nothing else."""
@@ -17,7 +58,7 @@ class TitleAndTextBlock(blocks.StructBlock):
         label = "Title & Text"
 
 
-class CardBlock(blocks.StructBlock):
+class CardBlock(CachedRenderMixin, BulkStructMixin, blocks.StructBlock):
     """Cards with image and text and button(s)."""
 
     title = blocks.CharBlock(required=True, help_text="Add your title")
@@ -50,7 +91,7 @@ class RichtextBlock(blocks.RichTextBlock):
     """Richtext with all the features."""
 
     def get_api_representation(self, value, context=None):
-        return richtext(value.source)
+        return expand_richtext(value.source)
 
     class Meta:  # noqa
         template = "streams/richtext_block.html"
@@ -73,7 +114,7 @@ class SimpleRichtextBlock(blocks.RichTextBlock):
         label = "Simple RichText"
 
 
-class CTABlock(blocks.StructBlock):
+class CTABlock(BulkStructMixin, blocks.StructBlock):
     """A simple call to action section."""
 
     title = blocks.CharBlock(required=True, max_length=60)
@@ -96,7 +137,7 @@ class LinkStructValue(blocks.StructValue):
         button_page = self.get('button_page')
         button_url = self.get('button_url')
         if button_page:
-            return button_page.url
+            return page_url_cache.get_url(button_page)
         elif button_url:
             return button_url
 
@@ -106,7 +147,7 @@ class LinkStructValue(blocks.StructValue):
     #     return BlogDetailPage.objects.live()[:3]
 
 
-class ButtonBlock(blocks.StructBlock):
+class ButtonBlock(BulkStructMixin, blocks.StructBlock):
     """An external or internal URL."""
 
     button_page = blocks.PageChooserBlock(
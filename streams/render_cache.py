@@ -0,0 +1,131 @@
+"""Opt-in render cache for StreamField blocks.
+
+A block class opts in by mixing in CachedRenderMixin. Its rendered HTML is
+cached on the block class, the template and a hash of the block's stored
+value, so an unchanged block renders once however many times a post is
+viewed (and identical blocks in different posts and revisions share it).
+
+Pages and images a block refers to (through chooser blocks, or linked and
+embedded in rich text) are found in the stored value and their
+generations are part of the key, so publishing or moving a linked page, or
+editing an image, re-renders the blocks using them; Site and document edits
+re-render them all (see ``mysite.generations.dependencies_hash``).
+
+Only blocks that are expensive to render and whose templates depend on
+nothing but the block value should opt in (CardBlock renders a rendition
+and a page URL per card); for cheap blocks the lookups cost more than the
+render. ``prime_render_cache`` looks up every cached block of a stream with
+one generation lookup per type and one ``get_many``. Previews are always
+rendered live.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.safestring import mark_safe
+
+from wagtail.core import blocks
+from wagtail.images.blocks import ImageChooserBlock
+
+from mysite.generations import dependencies_hash, get_dependency_generations
+
+from . import richtext
+
+CACHE_TIMEOUT = getattr(settings, "BLOCK_RENDER_CACHE_TIMEOUT", 60 * 60 * 24)
+
+
+def collect_references(block, prep_value, page_ids, image_ids):
+    """Add the ids of the pages and images in a stored block value to the sets."""
+    if prep_value is None:
+        return
+    if isinstance(block, blocks.PageChooserBlock):
+        page_ids.add(prep_value)
+    elif isinstance(block, ImageChooserBlock):
+        image_ids.add(prep_value)
+    elif isinstance(block, blocks.RichTextBlock):
+        pages, images = richtext.get_references(prep_value)
+        page_ids |= pages
+        image_ids |= images
+    elif isinstance(block, blocks.StructBlock):
+        for name, child_block in block.child_blocks.items():
+            collect_references(child_block, prep_value.get(name), page_ids, image_ids)
+    elif isinstance(block, blocks.ListBlock):
+        for item in prep_value:
+            collect_references(block.child_block, item, page_ids, image_ids)
+    elif isinstance(block, blocks.StreamBlock):
+        for item in prep_value:
+            child_block = block.child_blocks.get(item["type"])
+            if child_block is not None:
+                collect_references(child_block, item["value"], page_ids, image_ids)
+
+
+def make_render_cache_key(block, prep_value, generations):
+    page_ids, image_ids = set(), set()
+    collect_references(block, prep_value, page_ids, image_ids)
+    value_hash = hashlib.md5(
+        json.dumps(prep_value, sort_keys=True, cls=DjangoJSONEncoder).encode("utf-8")
+    ).hexdigest()
+    return "block:{}.{}:{}:{}:{}".format(
+        type(block).__module__,
+        type(block).__name__,
+        getattr(block.meta, "template", ""),
+        value_hash,
+        dependencies_hash(page_ids, image_ids, generations),
+    )
+
+
+def get_render_cache_keys(items):
+    """Return a cache key per ``(block, value)``, with one generation lookup per type."""
+    prep_values = [block.get_prep_value(value) for block, value in items]
+    page_ids, image_ids = set(), set()
+    for (block, value), prep_value in zip(items, prep_values):
+        collect_references(block, prep_value, page_ids, image_ids)
+    generations = get_dependency_generations(page_ids, image_ids)
+    return [
+        make_render_cache_key(block, prep_value, generations)
+        for (block, value), prep_value in zip(items, prep_values)
+    ]
+
+
+def prime_render_cache(stream_value):
+    """Look up the cached HTML of every cached block in a StreamField value at once.
+
+    The blocks' ``render`` then uses what was found instead of doing its
+    own lookups.
+    """
+    items = [
+        (child.block, child.value)
+        for child in stream_value or []
+        if isinstance(child.block, CachedRenderMixin)
+    ]
+    if not items:
+        return
+    keys = get_render_cache_keys(items)
+    found = cache.get_many(keys)
+    for (block, value), key in zip(items, keys):
+        value._render_cache = (key, found.get(key))
+
+
+class CachedRenderMixin:
+    """Cache the rendered HTML of a block (see the module docstring)."""
+
+    def get_render_cache_key(self, value):
+        return get_render_cache_keys([(self, value)])[0]
+
+    def render(self, value, context=None):
+        request = context.get("request") if context else None
+        if getattr(request, "is_preview", False):
+            return super().render(value, context=context)
+
+        primed = getattr(value, "_render_cache", None)
+        if primed is not None:
+            key, html = primed
+        else:
+            key = self.get_render_cache_key(value)
+            html = cache.get(key)
+        if html is None:
+            html = super().render(value, context=context)
+            cache.set(key, str(html), CACHE_TIMEOUT)
+        return mark_safe(html)
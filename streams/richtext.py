@@ -0,0 +1,177 @@
+"""Cached, batched expansion of rich text stored in the database format.
+
+Wagtail's ``expand_db_html`` resolves each ``<a linktype="page">`` and
+``<embed embedtype="image">`` with its own query (and each image's
+rendition with another). Here the sources are scanned for every page and
+image id first, the page URLs are read from the process-wide PageURLCache
+(one query for the pages it doesn't know yet), the images are loaded with
+one ``in_bulk`` and their renditions with one more query, and each source
+is rewritten in a single pass. Any other link and embed types (documents,
+media) are left to Wagtail's handlers. The ``code`` and ``center`` features
+registered in streams/wagtail_hooks.py are contentstate (editor) rules and
+are stored as plain ``<code>`` and ``<div>`` tags, so they need no expanding.
+
+The expanded HTML is cached by a hash of the source, so it is shared by
+every block, revision and page holding the same text. The key also holds
+the generation of each linked page and image, so the entry goes stale when
+one of them is published, moved or edited, and of the Sites and documents
+(see ``dependencies_hash``).
+"""
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from wagtail.core.blocks import StreamValue, StructValue
+from wagtail.core.rich_text import RichText, expand_db_html
+from wagtail.core.rich_text.rewriters import extract_attrs
+from wagtail.images import get_image_model
+from wagtail.images.formats import get_image_format
+
+from blog.renditions import prefetch_renditions
+from mysite.generations import dependencies_hash, get_dependency_generations
+from mysite.page_urls import page_url_cache
+
+PAGE_LINK_RE = re.compile(r'<a(\b[^>]*\blinktype="page"[^>]*)>')
+IMAGE_EMBED_RE = re.compile(r'<embed(\b[^>]*\bembedtype="image"[^>]*)/>')
+
+CACHE_TIMEOUT = getattr(settings, "RICHTEXT_CACHE_TIMEOUT", 60 * 60 * 24)
+
+
+def _get_id(attrs):
+    try:
+        return int(attrs["id"])
+    except (KeyError, ValueError):
+        return None
+
+
+def get_references(source):
+    """Return the ids of the pages linked and the images embedded in ``source``."""
+    page_ids = {_get_id(extract_attrs(attrs)) for attrs in PAGE_LINK_RE.findall(source)}
+    image_ids = {_get_id(extract_attrs(attrs)) for attrs in IMAGE_EMBED_RE.findall(source)}
+    page_ids.discard(None)
+    image_ids.discard(None)
+    return page_ids, image_ids
+
+
+def get_richtext_sources(value):
+    """Yield the source of every rich text value in a (nested) block value."""
+    if isinstance(value, RichText):
+        yield value.source
+    elif isinstance(value, StreamValue):
+        for child in value:
+            yield from get_richtext_sources(child.value)
+    elif isinstance(value, StructValue):
+        for child in value.values():
+            yield from get_richtext_sources(child)
+    elif isinstance(value, (list, tuple)):
+        for child in value:
+            yield from get_richtext_sources(child)
+
+
+def _cache_keys(sources):
+    """Return ``{cache key: source}``, with one generation lookup per type."""
+    references = {source: get_references(source) for source in sources}
+    generations = get_dependency_generations(
+        set().union(*(pages for pages, images in references.values())),
+        set().union(*(images for pages, images in references.values())),
+    )
+    return {
+        "richtext:{}:{}".format(
+            hashlib.md5(source.encode("utf-8")).hexdigest(),
+            dependencies_hash(page_ids, image_ids, generations),
+        ): source
+        for source, (page_ids, image_ids) in references.items()
+    }
+
+
+def expand_db_html_batch(sources):
+    """Return ``{source: html}`` like ``expand_db_html``, with batched lookups."""
+    page_ids, image_ids = set(), set()
+    for source in sources:
+        pages, images = get_references(source)
+        page_ids |= pages
+        image_ids |= images
+
+    page_url_cache.prime(page_ids)
+    page_urls = {pk: page_url_cache.get_url(pk) for pk in page_ids}
+    images = get_image_model().objects.in_bulk(image_ids) if image_ids else {}
+
+    embeds = [
+        (images.get(_get_id(attrs)), get_image_format(attrs.get("format")), attrs)
+        for source in sources
+        for attrs in map(extract_attrs, IMAGE_EMBED_RE.findall(source))
+    ]
+    prefetch_renditions(
+        (image, image_format.filter_spec)
+        for image, image_format, attrs in embeds
+        if image is not None and image_format is not None
+    )
+
+    def replace_page_link(match):
+        url = page_urls.get(_get_id(extract_attrs(match.group(1))))
+        if url is None:
+            return "<a>"
+        return '<a href="{}">'.format(escape(url))
+
+    def replace_image_embed(match):
+        attrs = extract_attrs(match.group(1))
+        image = images.get(_get_id(attrs))
+        if image is None:
+            return '<img alt="">'
+        return get_image_format(attrs.get("format")).image_to_html(
+            image, attrs.get("alt", "")
+        )
+
+    expanded = {}
+    for source in sources:
+        html = PAGE_LINK_RE.sub(replace_page_link, source)
+        html = IMAGE_EMBED_RE.sub(replace_image_embed, html)
+        # Whatever is left (documents, external media) goes through Wagtail
+        expanded[source] = expand_db_html(html)
+    return expanded
+
+
+def expand_richtexts(sources):
+    """Return ``{source: html}`` for several sources, cached and batched.
+
+    Only the sources missing from the cache are expanded, together.
+    """
+    keys = _cache_keys({source for source in sources if source})
+    if not keys:
+        return {}
+    found = cache.get_many(keys.keys())
+    missing = [source for key, source in keys.items() if key not in found]
+    if missing:
+        new = {
+            source: render_to_string("wagtailcore/shared/richtext.html", {"html": html})
+            for source, html in expand_db_html_batch(missing).items()
+        }
+        cache.set_many(
+            {key: new[source] for key, source in keys.items() if source in new},
+            CACHE_TIMEOUT,
+        )
+        found.update(
+            (key, new[source]) for key, source in keys.items() if source in new
+        )
+    return {keys[key]: mark_safe(html) for key, html in found.items()}
+
+
+def prime_richtext(value):
+    """Expand all the rich text in a StreamField value together.
+
+    The ``cached_richtext`` filters in the block templates then read it
+    from the cache.
+    """
+    expand_richtexts(get_richtext_sources(value))
+
+
+def expand_richtext(source):
+    """The cached equivalent of the ``richtext`` template filter."""
+    if not source:
+        return ""
+    return expand_richtexts([source])[source]
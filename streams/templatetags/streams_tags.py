@@ -0,0 +1,20 @@
+from django import template
+
+from mysite.page_urls import page_url_cache
+from streams.richtext import expand_richtext
+
+register = template.Library()
+
+
+@register.filter
+def cached_richtext(value):
+    """Like wagtailcore's ``richtext`` filter, but cached (see streams/richtext.py)."""
+    if value is None:
+        return ""
+    return expand_richtext(getattr(value, "source", value))
+
+
+@register.filter
+def page_url(page):
+    """``page.url`` read from the process-wide PageURLCache; takes a page or an id."""
+    return page_url_cache.get_url(page) or ""
@@ -1,3 +1,88 @@
-from django.test import TestCase
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from wagtail.core import blocks
+from wagtail.core.models import Page
+from wagtail.images import get_image_model
+from wagtail.images.tests.utils import get_test_image_file
+
+from .blocks import ButtonBlock, CardBlock, CTABlock
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class BulkToPythonTests(TestCase):
+    stream_block = blocks.StreamBlock([
+        ("cards", CardBlock()),
+        ("cta", CTABlock()),
+        ("button", ButtonBlock()),
+    ])
+
+    @classmethod
+    def setUpTestData(cls):
+        root = Page.get_first_root_node()
+        cls.pages = [
+            root.add_child(instance=Page(title="Page {}".format(i), slug="page-{}".format(i)))
+            for i in range(10)
+        ]
+        Image = get_image_model()
+        cls.images = [
+            Image.objects.create(title="Image {}".format(i), file=get_test_image_file())
+            for i in range(10)
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def get_stream(self, num_cards):
+        cards = [
+            {
+                "image": image.pk,
+                "title": "Card",
+                "text": "Text",
+                "button_page": page.pk,
+                "button_url": "",
+            }
+            for image, page in zip(self.images[:num_cards], self.pages)
+        ]
+        return self.stream_block.to_python([
+            {"type": "cards", "value": {"title": "Cards", "cards": cards}},
+            {"type": "cards", "value": {"title": "More cards", "cards": cards}},
+            {"type": "cta", "value": {
+                "title": "CTA",
+                "text": "<p>Text</p>",
+                "button_page": self.pages[0].pk,
+                "button_url": "",
+                "button_text": "Go",
+            }},
+            {"type": "button", "value": {"button_page": self.pages[1].pk, "button_url": ""}},
+        ])
+
+    def count_queries(self, num_cards):
+        stream = self.get_stream(num_cards)
+        with CaptureQueriesContext(connection) as queries:
+            [child.value for child in stream]
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_cards(self):
+        # Cards: one query for images and one for pages; CTA and button: one each
+        self.assertEqual(self.count_queries(1), 4)
+        self.assertEqual(self.count_queries(10), 4)
+
+    def test_values_are_converted(self):
+        stream = self.get_stream(3)
+
+        cards = stream[0].value["cards"]
+        self.assertEqual([card["image"] for card in cards], self.images[:3])
+        self.assertEqual([card["button_page"] for card in cards], self.pages[:3])
+        self.assertEqual(cards[0]["title"], "Card")
+        self.assertEqual(stream[1].value["title"], "More cards")
+        self.assertEqual(stream[2].value["button_page"], self.pages[0])
+        self.assertEqual(stream[3].value.url(), self.pages[1].url)